@@ -0,0 +1,87 @@
+"""
+Admission
+Cost estimates for generation requests, checked against render budgets before a job is accepted
+"""
+
+import os
+import math
+
+# Songs last 2 seconds per lyric word, within these bounds
+SECONDS_PER_WORD = 2
+MIN_SONG_SECONDS = 120
+MAX_SONG_SECONDS = 300
+
+# Tempos a song can be rendered at, in BPM
+MIN_TEMPO = 40
+MAX_TEMPO = 300
+
+# Lyrics beyond this many bytes never lengthen the song, only the stored record
+MAX_LYRICS_BYTES = int(os.environ.get('MAX_LYRICS_BYTES', 64 * 1024))
+
+# Render cost model: CPU seconds per second of audio (mix, effects, peak pass and
+# encode) on top of a fixed cost per job, and memory beyond the worker's own
+CPU_PER_AUDIO_SECOND = float(os.environ.get('ADMISSION_CPU_PER_AUDIO_SECOND', 0.015))
+JOB_BASE_CPU_SECONDS = float(os.environ.get('ADMISSION_JOB_BASE_CPU_SECONDS', 0.3))
+JOB_BASE_MEMORY = int(os.environ.get('ADMISSION_JOB_BASE_MB', 64)) * 1024 * 1024
+
+
+class AdmissionRejected(Exception):
+    """A request the render budgets cannot take now (429) or ever (413)"""
+
+    def __init__(self, message, status=429, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+def song_duration(lyrics):
+    """Length in seconds of the song rendered for lyrics"""
+    return max(MIN_SONG_SECONDS, min(MAX_SONG_SECONDS, len(lyrics.split()) * SECONDS_PER_WORD))
+
+
+def estimate_cost(params):
+    """Estimate CPU seconds and peak memory of rendering params, before any work starts.
+
+    Blocks stream into the encoder, so memory only grows with the song where a
+    full-length buffer is kept: the shared output of a parallel render and a stem
+    being written to the stem store.
+    """
+    manifest = params.get('manifest')
+    duration = manifest['duration'] if manifest else song_duration(params['lyrics'])
+    itemsize = 4 if os.environ.get('AUDIO_PRECISION', 'float64') == 'float32' else 8
+    full_length_bytes = int(duration * 44100 * itemsize)
+
+    buffers = 0
+    if int(os.environ.get('RENDER_WORKERS', 1)) > 1:
+        buffers += 1
+    if int(os.environ.get('STEM_STORE_MAX_MB', 0)) > 0:
+        buffers += 1
+
+    return {
+        'duration_seconds': duration,
+        'cpu_seconds': round(JOB_BASE_CPU_SECONDS + duration * CPU_PER_AUDIO_SECOND, 3),
+        'memory_bytes': JOB_BASE_MEMORY + buffers * full_length_bytes
+    }
+
+
+def max_wait_seconds():
+    """Longest estimated queue wait a new request is accepted with"""
+    return float(os.environ.get('ADMISSION_MAX_WAIT_SECONDS', 60))
+
+
+def check_memory(cost, budget):
+    """Reject a job that could never fit in a memory budget of budget bytes"""
+    if cost['memory_bytes'] > budget:
+        raise AdmissionRejected(
+            f"Render needs about {cost['memory_bytes'] // (1024 * 1024)} MB, "
+            f"more than the {budget // (1024 * 1024)} MB render budget", status=413
+        )
+
+
+def check_wait(wait):
+    """Reject with a Retry-After hint when the estimated wait exceeds the limit"""
+    limit = max_wait_seconds()
+    if wait > limit:
+        raise AdmissionRejected(
+            f"Render queue is full (estimated wait {wait:.0f}s)", retry_after=max(1, math.ceil(wait - limit))
+        )
@@ -0,0 +1,174 @@
+"""
+ASGI entry point
+Serves the Flask app through an ASGI adapter and renders songs natively on the event loop
+
+    uvicorn asgi:application --workers 4
+
+POST /api/generation/render takes a JSON body (lyrics plus the same fields as the
+generation form) and answers once the song is rendered. Renders share one event
+loop per server process: synthesis runs in the default executor and ffmpeg is an
+awaited subprocess, so a slow encode never blocks other requests.
+"""
+
+import os
+import json
+import math
+import time
+import asyncio
+
+# Imported first so the startup report covers every other import
+import startup
+
+from asgiref.wsgi import WsgiToAsgi
+
+import metrics
+from admission import AdmissionRejected, check_memory, check_wait, estimate_cost
+from app import app as flask_app
+from generation_queue import JOB_COMPLETED, JOB_FAILED
+from src.routes.generation import build_generation_params, get_render_cache, save_generated_song, job_info
+
+RENDER_ROUTE = '/api/generation/render'
+
+wsgi_application = WsgiToAsgi(flask_app)
+
+# Bounds the renders sharing this process's event loop, created on first use
+_render_slots = None
+_render_slot_count = int(os.environ.get('ASGI_MAX_RENDERS', os.cpu_count() or 1))
+
+# Estimated CPU seconds and memory of the renders admitted and not yet finished
+_admitted = {'cpu_seconds': 0.0, 'memory_bytes': 0}
+
+
+def get_render_slots():
+    """Bound concurrent renders so their note banks and ffmpeg processes fit in memory"""
+    global _render_slots
+    if _render_slots is None:
+        _render_slots = asyncio.Semaphore(_render_slot_count)
+    return _render_slots
+
+
+def admit_render(params):
+    """Estimate a render and check it against this process's budgets; raises AdmissionRejected"""
+    cost = estimate_cost(params)
+    budget = int(os.environ.get('GENERATION_MEMORY_BUDGET_MB', 2048)) * 1024 * 1024
+    check_memory(cost, budget)
+    wait = _admitted['cpu_seconds'] / _render_slot_count
+    if _admitted['memory_bytes'] + cost['memory_bytes'] > budget:
+        raise AdmissionRejected('Render memory budget is in use', retry_after=max(1, math.ceil(wait)))
+    check_wait(wait)
+    return cost
+
+
+async def read_body(receive, limit):
+    """Read the request body; returns None once it grows past limit bytes"""
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if len(body) > limit:
+            return None
+        if not message.get('more_body'):
+            return body
+
+
+async def send_json(send, status, payload, headers=()):
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode()), *headers]
+    })
+    await send({'type': 'http.response.body', 'body': body})
+    return status
+
+
+async def render_song(receive, send):
+    """Render a song from a JSON request and answer with the finished result"""
+    try:
+        body = await read_body(receive, flask_app.config['MAX_CONTENT_LENGTH'])
+        if body is None:
+            return await send_json(send, 413, {'success': False, 'error': 'Upload too large'})
+        values = json.loads(body or b'{}')
+        lyrics = values.get('lyrics')
+        if not lyrics:
+            return await send_json(send, 400, {'success': False, 'error': 'No lyrics provided'})
+        with flask_app.app_context():
+            params = build_generation_params(lyrics, values)
+            cache = get_render_cache()
+    except (ValueError, AttributeError) as e:
+        return await send_json(send, 400, {'success': False, 'error': str(e)})
+
+    try:
+        cost = admit_render(params)
+    except AdmissionRejected as e:
+        headers = [(b'retry-after', str(e.retry_after).encode())] if e.retry_after else []
+        return await send_json(send, e.status, {'success': False, 'error': str(e), 'retry_after': e.retry_after}, headers)
+
+    _admitted['cpu_seconds'] += cost['cpu_seconds']
+    _admitted['memory_bytes'] += cost['memory_bytes']
+    try:
+        print(f"🎵 Rendering: {params['title']} - {params['maqam']} {params['style']} {params['emotion']} {params['tempo']}BPM")
+        async with get_render_slots():
+            start_time = time.perf_counter()
+            result = await startup.get_generator().generate_song(render_cache=cache, **params)
+        if not result['success']:
+            metrics.generation_jobs.inc(JOB_FAILED)
+            return await send_json(send, 500, {'success': False, 'error': result['error']})
+
+        result['generation_time'] = round(time.perf_counter() - start_time, 2)
+        metrics.observe_stages(result.pop('stages', None))
+        metrics.generation_jobs.inc(JOB_COMPLETED)
+
+        # The database session is synchronous, so commit off the loop
+        loop = asyncio.get_running_loop()
+        result.update(await loop.run_in_executor(None, save_generated_song, flask_app, params, result))
+        return await send_json(send, 200, {
+            'message': f'Song "{params["title"]}" generated successfully!',
+            **job_info(params),
+            **result
+        })
+    except Exception as e:
+        print(f"❌ Render error: {e}")
+        return await send_json(send, 500, {'success': False, 'error': f'Render failed: {str(e)}'})
+    finally:
+        _admitted['cpu_seconds'] -= cost['cpu_seconds']
+        _admitted['memory_bytes'] -= cost['memory_bytes']
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            loop = asyncio.get_running_loop()
+            if startup.migrate_on_start():
+                from migrations import migrate
+
+                await loop.run_in_executor(None, migrate)
+                startup.report.checkpoint('migrate')
+            if startup.server_role() == startup.ROLE_RENDER:
+                await loop.run_in_executor(None, startup.preload_render_stack)
+            startup.report.print_report()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+
+    if scope['type'] == 'http' and scope['path'] == RENDER_ROUTE:
+        if scope['method'] != 'POST':
+            return await send_json(send, 405, {'success': False, 'error': 'Method not allowed'})
+        if not startup.renders_here():
+            return await send_json(send, 503, {'success': False, 'error': 'Rendering is served by render workers'})
+        start_time = time.perf_counter()
+        status = await render_song(receive, send)
+        metrics.http_latency.observe(time.perf_counter() - start_time, RENDER_ROUTE, 'POST')
+        metrics.http_requests.inc(RENDER_ROUTE, 'POST', str(status))
+        if status >= 500:
+            metrics.http_errors.inc(RENDER_ROUTE, 'POST')
+        return
+
+    return await wsgi_application(scope, receive, send)
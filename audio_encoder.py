@@ -0,0 +1,188 @@
+"""
+Audio Encoder
+Encodes float audio by piping 16-bit PCM straight into ffmpeg, with no temp WAV on disk
+"""
+
+import os
+import asyncio
+import shutil
+import subprocess
+import numpy as np
+
+from audio_formats import AUDIO_FORMATS, file_checksum
+
+# Samples converted to PCM and written to the pipe at a time
+PCM_CHUNK_SAMPLES = 1 << 16
+
+
+def get_ffmpeg_binary():
+    """Locate ffmpeg, honouring the FFMPEG_BINARY override"""
+    return os.environ.get('FFMPEG_BINARY') or shutil.which('ffmpeg') or 'ffmpeg'
+
+
+def float_to_pcm16(audio, out=None, scratch=None):
+    """Convert a float buffer in [-1, 1] to little-endian 16-bit PCM.
+
+    out and scratch are optional int16 and float buffers at least len(audio) long,
+    reused across calls so the conversion allocates nothing.
+    """
+    if audio.dtype == np.int16:
+        return audio
+    if scratch is None:
+        scratch = np.empty(len(audio), dtype=audio.dtype)
+    if out is None:
+        out = np.empty(len(audio), dtype='<i2')
+    scratch = scratch[:len(audio)]
+    out = out[:len(audio)]
+    np.clip(audio, -1.0, 1.0, out=scratch)
+    np.multiply(scratch, 32767, out=out, casting='unsafe')
+    return out
+
+
+def iter_chunks(audio, chunk_samples=PCM_CHUNK_SAMPLES):
+    """Split a buffer into fixed-size views without copying"""
+    for start in range(0, len(audio), chunk_samples):
+        yield audio[start:start + chunk_samples]
+
+
+class AudioEncoder:
+    """Encodes mono float audio to MP3, Ogg/Opus or FLAC through an ffmpeg pipe"""
+
+    def __init__(self, audio_format='mp3', bitrate=None, sample_rate=44100, channels=1):
+        if audio_format not in AUDIO_FORMATS:
+            raise ValueError(f"Unsupported audio format: {audio_format}")
+        self.audio_format = audio_format
+        self.settings = AUDIO_FORMATS[audio_format]
+        self.bitrate = bitrate or self.settings['default_bitrate']
+        self.sample_rate = sample_rate
+        self.channels = channels
+
+    @property
+    def extension(self):
+        return self.settings['extension']
+
+    @property
+    def mimetype(self):
+        return self.settings['mimetype']
+
+    def build_command(self, output_path):
+        command = [
+            get_ffmpeg_binary(), '-hide_banner', '-loglevel', 'error', '-y',
+            '-f', 's16le', '-ar', str(self.sample_rate), '-ac', str(self.channels), '-i', 'pipe:0'
+        ]
+        command += self.settings['codec_args']
+        if self.bitrate:
+            command += ['-b:a', self.bitrate]
+        command += ['-f', self.settings['container'], output_path]
+        return command
+
+    def encode(self, audio, output_path):
+        """Encode a whole buffer to output_path"""
+        return self.encode_blocks(iter_chunks(audio), output_path)
+
+    def encode_blocks(self, blocks, output_path):
+        """Encode an iterable of float or int16 PCM blocks to output_path.
+
+        The encoder writes to a .part file next to output_path which is renamed into
+        place only after ffmpeg succeeds, so a crash never leaves a truncated file.
+        """
+        temp_path = f"{output_path}.part"
+        process = subprocess.Popen(
+            self.build_command(temp_path),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE
+        )
+
+        total_samples = 0
+        pcm = np.empty(PCM_CHUNK_SAMPLES, dtype='<i2')
+        scratch = {}
+        try:
+            try:
+                for block in blocks:
+                    if block.dtype != np.int16 and block.dtype not in scratch:
+                        scratch[block.dtype] = np.empty(PCM_CHUNK_SAMPLES, dtype=block.dtype)
+                    for chunk in iter_chunks(block):
+                        process.stdin.write(float_to_pcm16(chunk, pcm, scratch.get(block.dtype)).data)
+                    total_samples += len(block)
+                process.stdin.close()
+            except BrokenPipeError:
+                pass  # ffmpeg exited early; its error is reported below
+        except BaseException:
+            process.kill()
+            process.wait()
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        stderr = process.stderr.read().decode('utf-8', errors='replace')
+        return self._finish(process.wait(), stderr, temp_path, output_path, total_samples)
+
+    async def encode_blocks_async(self, blocks, output_path):
+        """Awaitable encode_blocks for use on a shared event loop.
+
+        Blocks are pulled from the iterable in the default executor, since producing
+        them is CPU work, and ffmpeg runs as an asyncio subprocess whose pipe is
+        drained between writes.
+        """
+        loop = asyncio.get_running_loop()
+        temp_path = f"{output_path}.part"
+        process = await asyncio.create_subprocess_exec(
+            *self.build_command(temp_path),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE
+        )
+
+        total_samples = 0
+        blocks = iter(blocks)
+        try:
+            try:
+                while True:
+                    block = await loop.run_in_executor(None, next, blocks, None)
+                    if block is None:
+                        break
+                    for chunk in iter_chunks(block):
+                        # The transport may hold on to the data, so hand it a copy
+                        process.stdin.write(float_to_pcm16(chunk).tobytes())
+                        await process.stdin.drain()
+                    total_samples += len(block)
+                process.stdin.close()
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # ffmpeg exited early; its error is reported below
+        except BaseException:
+            process.kill()
+            await process.wait()
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        stderr = (await process.stderr.read()).decode('utf-8', errors='replace')
+        returncode = await process.wait()
+        return await loop.run_in_executor(
+            None, self._finish, returncode, stderr, temp_path, output_path, total_samples
+        )
+
+    def _finish(self, returncode, stderr, temp_path, output_path, total_samples):
+        """Check ffmpeg's exit status, then checksum the output and move it into place"""
+        if returncode != 0:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise RuntimeError(f"ffmpeg failed to encode {self.audio_format}: {stderr.strip()[-500:]}")
+
+        checksum = file_checksum(temp_path)
+        os.replace(temp_path, output_path)
+
+        return {
+            'path': output_path,
+            'format': self.audio_format,
+            'bitrate': self.bitrate,
+            'bytes': os.path.getsize(output_path),
+            'checksum': checksum,
+            'duration_seconds': total_samples / self.sample_rate
+        }
+
+
+def encode_audio(audio, sample_rate, output_path, audio_format='mp3', bitrate=None):
+    """Encode a float buffer to output_path in the given format"""
+    return AudioEncoder(audio_format, bitrate, sample_rate).encode(audio, output_path)
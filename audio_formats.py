@@ -0,0 +1,53 @@
+"""
+Audio Formats
+Output format table, song filenames and file checksums, importable without the numpy/ffmpeg encoding stack
+"""
+
+import hashlib
+
+# Container/codec settings per output format
+AUDIO_FORMATS = {
+    'mp3': {
+        'extension': '.mp3',
+        'mimetype': 'audio/mpeg',
+        'container': 'mp3',
+        'codec_args': ['-codec:a', 'libmp3lame'],
+        'default_bitrate': '192k'
+    },
+    'ogg': {
+        'extension': '.ogg',
+        'mimetype': 'audio/ogg',
+        'container': 'ogg',
+        'codec_args': ['-codec:a', 'libopus', '-ar', '48000'],  # Opus only runs at 48 kHz
+        'default_bitrate': '96k'
+    },
+    'opus': {
+        'extension': '.opus',
+        'mimetype': 'audio/ogg',
+        'container': 'ogg',
+        'codec_args': ['-codec:a', 'libopus', '-ar', '48000'],
+        'default_bitrate': '96k'
+    },
+    'flac': {
+        'extension': '.flac',
+        'mimetype': 'audio/flac',
+        'container': 'flac',
+        'codec_args': ['-codec:a', 'flac'],
+        'default_bitrate': None  # Lossless
+    }
+}
+
+
+def song_filename(title, maqam, style, render_id, extension, suffix=''):
+    """Filename of one render; render_id keeps songs sharing a title from overwriting each other"""
+    safe_title = "".join(c for c in title if c.isalnum() or c in (' ', '-', '_')).rstrip()
+    return f"{safe_title}_{maqam}_{style}_{render_id}{suffix}{extension}"
+
+
+def file_checksum(path, chunk_size=1024 * 1024):
+    """SHA-256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the synthesis and encoding pipeline
+
+Times and memory-profiles the ArabicMusicGenerator stages over a matrix of
+durations, maqamat, tempos and sample rates, writes the results as JSON and
+optionally compares them against a stored baseline.
+
+    python benchmarks/bench_generator.py --quick --output bench.json
+    python benchmarks/bench_generator.py --baseline bench_baseline.json
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import statistics
+import subprocess
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from admission import MAX_SONG_SECONDS, MIN_SONG_SECONDS, song_duration
+from music_generator import ArabicMusicGenerator
+
+FULL_MATRIX = {
+    'durations': [30, 60, 120, 300],
+    'maqamat': ['hijaz', 'bayati', 'saba'],
+    'tempos': [80, 120, 160],
+    'sample_rates': [22050, 44100]
+}
+
+QUICK_MATRIX = {
+    'durations': [30, 120],
+    'maqamat': ['hijaz'],
+    'tempos': [120],
+    'sample_rates': [44100]
+}
+
+BENCHMARKS = ['melody', 'rhythm', 'effects', 'procedural', 'encode']
+
+
+def make_generator(sample_rate, precision='float64'):
+    generator = ArabicMusicGenerator()
+    generator.sample_rate = sample_rate
+    generator.dtype = np.dtype(precision)
+    return generator
+
+
+def lyrics_for_duration(duration):
+    """Lyrics for a song of duration seconds, which must lie within the song length bounds"""
+    lyrics = ' '.join(['كلمة'] * max(1, duration // 2))
+    if song_duration(lyrics) != duration:
+        raise ValueError(f"Songs last {MIN_SONG_SECONDS}-{MAX_SONG_SECONDS}s, not {duration}s")
+    return lyrics
+
+
+def procedural_durations(durations):
+    """Song lengths the procedural cases can render: durations clamped like song_duration, deduplicated"""
+    return sorted({min(max(duration, MIN_SONG_SECONDS), MAX_SONG_SECONDS) for duration in durations})
+
+
+def test_signal(duration, sample_rate, precision='float64'):
+    rng = np.random.default_rng(0)
+    return rng.uniform(-0.5, 0.5, int(duration * sample_rate)).astype(precision)
+
+
+def build_cases(matrix, selected, precision='float64'):
+    """Expand the matrix into (name, params) cases, varying only what each stage depends on"""
+    cases = []
+    for sample_rate in matrix['sample_rates']:
+        if 'rhythm' in selected:
+            for tempo in matrix['tempos']:
+                cases.append(('rhythm', {'tempo': tempo, 'sample_rate': sample_rate}))
+        for duration in matrix['durations']:
+            if 'effects' in selected:
+                cases.append(('effects', {'duration': duration, 'sample_rate': sample_rate}))
+            if 'encode' in selected:
+                cases.append(('encode', {'duration': duration, 'sample_rate': sample_rate}))
+            if 'melody' in selected:
+                for maqam in matrix['maqamat']:
+                    cases.append(('melody', {'duration': duration, 'maqam': maqam, 'sample_rate': sample_rate}))
+        # Lyrics set the song length, so shorter durations would only repeat the shortest song
+        if 'procedural' in selected:
+            for duration in procedural_durations(matrix['durations']):
+                for maqam in matrix['maqamat']:
+                    for tempo in matrix['tempos']:
+                        cases.append(('procedural', {'duration': duration, 'maqam': maqam,
+                                                     'tempo': tempo, 'sample_rate': sample_rate}))
+    # Only non-default precision goes into the params, so older baselines still match
+    if precision != 'float64':
+        for _, params in cases:
+            params['precision'] = precision
+    return cases
+
+
+def prepare_case(name, params, workdir):
+    """Return a zero-argument callable running one case, with inputs built outside the timing"""
+    precision = params.get('precision', 'float64')
+    generator = make_generator(params['sample_rate'], precision)
+
+    if name == 'melody':
+        # Songs render phrases a quarter of the song long
+        return lambda: generator.generate_arabic_melody(params['maqam'], 220, params['duration'] / 4)
+
+    if name == 'rhythm':
+        return lambda: generator.generate_rhythm_pattern(params['tempo'], 'traditional', 'happy')
+
+    if name == 'effects':
+        audio = test_signal(params['duration'], params['sample_rate'], precision)
+        return lambda: generator.apply_arabic_effects(audio, 'happy')
+
+    if name == 'procedural':
+        lyrics = lyrics_for_duration(params['duration'])
+        return lambda: asyncio.run(generator.generate_procedural_music(
+            lyrics, params['maqam'], 'traditional', 'happy', 'egyptian', params['tempo'], seed=0
+        ))
+
+    if name == 'encode':
+        audio = test_signal(params['duration'], params['sample_rate'], precision)
+        output_path = os.path.join(workdir, 'bench.mp3')
+        return lambda: generator.save_as_mp3(audio, params['sample_rate'], output_path)
+
+    raise ValueError(f"Unknown benchmark: {name}")
+
+
+def run_case(name, params, repeats, workdir):
+    run = prepare_case(name, params, workdir)
+
+    # Warm-up run also fills the generator's caches, as a long-lived worker would have
+    run()
+
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+
+    # Memory is measured on a separate run so tracing overhead does not skew the timings
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'name': name,
+        'params': params,
+        'repeats': repeats,
+        'wall_median_s': statistics.median(timings),
+        'wall_min_s': min(timings),
+        'peak_mb': peak / (1024 * 1024)
+    }
+
+
+def case_id(result):
+    params = ','.join(f"{key}={value}" for key, value in sorted(result['params'].items()))
+    return f"{result['name']}[{params}]"
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def compare_to_baseline(results, baseline, max_slowdown, max_memory_growth):
+    """Print a comparison table and return the list of regressed case ids"""
+    baseline_by_id = {case_id(result): result for result in baseline['results']}
+    regressions = []
+
+    print(f"\n{'case':<70} {'time':>8} {'memory':>8}")
+    for result in results:
+        key = case_id(result)
+        previous = baseline_by_id.get(key)
+        if previous is None:
+            print(f"{key:<70} {'new':>8} {'new':>8}")
+            continue
+
+        time_ratio = result['wall_median_s'] / max(previous['wall_median_s'], 1e-9)
+        memory_ratio = result['peak_mb'] / max(previous['peak_mb'], 1e-9)
+        flag = ''
+        if time_ratio > max_slowdown or memory_ratio > max_memory_growth:
+            regressions.append(key)
+            flag = '  REGRESSION'
+        print(f"{key:<70} {time_ratio:>7.2f}x {memory_ratio:>7.2f}x{flag}")
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the Arabic music synthesis and encoding pipeline')
+    parser.add_argument('--quick', action='store_true', help='Run the small matrix only')
+    parser.add_argument('--only', nargs='+', choices=BENCHMARKS, default=BENCHMARKS, help='Stages to run')
+    parser.add_argument('--durations', nargs='+', type=int)
+    parser.add_argument('--maqamat', nargs='+')
+    parser.add_argument('--tempos', nargs='+', type=int)
+    parser.add_argument('--sample-rates', nargs='+', type=int)
+    parser.add_argument('--precision', choices=['float64', 'float32'], default='float64',
+                        help='Sample precision to render with (see AUDIO_PRECISION)')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--output', default='bench_results.json', help='Where to write the JSON results')
+    parser.add_argument('--baseline', help='Baseline JSON to compare against')
+    parser.add_argument('--max-slowdown', type=float, default=1.2, help='Allowed median time ratio vs baseline')
+    parser.add_argument('--max-memory-growth', type=float, default=1.2, help='Allowed peak memory ratio vs baseline')
+    args = parser.parse_args(argv)
+
+    matrix = dict(QUICK_MATRIX if args.quick else FULL_MATRIX)
+    for key in ('durations', 'maqamat', 'tempos', 'sample_rates'):
+        if getattr(args, key):
+            matrix[key] = getattr(args, key)
+
+    cases = build_cases(matrix, args.only, args.precision)
+    print(f"🏁 Running {len(cases)} benchmark cases ({args.repeats} repeats each)")
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, params in cases:
+            result = run_case(name, params, args.repeats, workdir)
+            results.append(result)
+            print(f"  {case_id(result):<70} {result['wall_median_s'] * 1000:>9.1f} ms {result['peak_mb']:>8.1f} MB")
+
+    report = {
+        'meta': {
+            'timestamp': datetime.utcnow().isoformat(),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'matrix': matrix,
+            'repeats': args.repeats
+        },
+        'results': results
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, args.max_slowdown, args.max_memory_growth)
+        if regressions:
+            print(f"❌ {len(regressions)} case(s) regressed beyond the thresholds")
+            return 1
+        print("✅ No regressions against the baseline")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""
+Database Config
+Connection URL, pool sizing and SQLite pragmas for the Flask-SQLAlchemy engine
+"""
+
+import os
+import sqlite3
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+
+DEFAULT_DATABASE_URL = 'sqlite:///arabic_music_ai.db'
+
+# Where Flask-SQLAlchemy puts relative SQLite files: the app's instance folder
+INSTANCE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance')
+
+
+def database_url():
+    """DATABASE_URL from the environment, defaulting to the local SQLite file.
+    
+    Relative SQLite paths are made absolute under INSTANCE_DIR, so the app and
+    engines created outside it (migrations, server hooks) open the same file
+    whatever the working directory.
+    """
+    url = os.environ.get('DATABASE_URL') or DEFAULT_DATABASE_URL
+    # Heroku-style URLs use a scheme SQLAlchemy no longer accepts
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    if is_sqlite(url):
+        parsed = make_url(url)
+        database = parsed.database
+        if database and database != ':memory:' and not database.startswith('file:') and not os.path.isabs(database):
+            os.makedirs(INSTANCE_DIR, exist_ok=True)
+            url = parsed.set(database=os.path.join(INSTANCE_DIR, database)).render_as_string(hide_password=False)
+    return url
+
+
+def is_sqlite(url):
+    return url.startswith('sqlite')
+
+
+def engine_options(url):
+    """Engine options for url: busy waiting for SQLite, a sized connection pool otherwise"""
+    if is_sqlite(url):
+        return {
+            'connect_args': {
+                # Wait for a competing writer instead of failing with "database is locked"
+                'timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)) / 1000,
+                # Connections are handed between the request and queue callback threads
+                'check_same_thread': False
+            }
+        }
+    return {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': True
+    }
+
+
+@event.listens_for(Engine, 'connect')
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Put every new SQLite connection in WAL mode so readers never block the writer.
+
+    synchronous=NORMAL is durable across application crashes in WAL mode and only
+    risks the last transactions on power loss, in exchange for far fewer fsyncs.
+    """
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')}")
+    cursor.execute(f"PRAGMA synchronous={os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')}")
+    cursor.execute(f"PRAGMA busy_timeout={int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))}")
+    cursor.close()
+
+
+def configure_database(app):
+    """Point app at DATABASE_URL with engine options suited to its backend"""
+    url = database_url()
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(url)
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+    if is_sqlite(url):
+        print("✅ Using SQLite database (WAL mode) - will work on any platform!")
+    else:
+        print(f"✅ Using {url.split(':', 1)[0]} database (pool size {app.config['SQLALCHEMY_ENGINE_OPTIONS']['pool_size']})")
+    return url
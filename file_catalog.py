@@ -0,0 +1,76 @@
+"""
+Audio File Catalog
+Records every file written to generated_music so listings and downloads never scan the directory
+"""
+
+import os
+from datetime import datetime
+
+from audio_formats import AUDIO_FORMATS, file_checksum
+from src.models.song import db, AudioFile
+
+# Extension -> format name, for files found on disk
+EXTENSION_FORMATS = {settings['extension']: name for name, settings in AUDIO_FORMATS.items()}
+
+
+def record_audio_file(filename, size_bytes, audio_format, checksum=None, duration_seconds=None, song_id=None):
+    """Add or refresh the catalog row for filename; the caller commits.
+    
+    Raises ValueError rather than move a file cataloged for one song to another.
+    """
+    audio_file = AudioFile.query.filter_by(filename=filename).first()
+    if audio_file is None:
+        audio_file = AudioFile(filename=filename)
+        db.session.add(audio_file)
+    elif audio_file.song_id is not None and audio_file.song_id != song_id:
+        raise ValueError(f"{filename} is already cataloged for song {audio_file.song_id}")
+    
+    audio_file.song_id = song_id
+    audio_file.size_bytes = size_bytes
+    audio_file.format = audio_format
+    audio_file.checksum = checksum
+    audio_file.duration_seconds = duration_seconds
+    audio_file.created_at = datetime.utcnow()
+    return audio_file
+
+
+def reconcile_catalog(generated_dir, dry_run=False):
+    """Repair drift between the catalog and the files in generated_dir.
+    
+    Rows whose file is gone are removed, rows whose size changed get a fresh size and
+    checksum, and audio files with no row are added without a song id.
+    """
+    report = {'removed': [], 'updated': [], 'added': []}
+    
+    on_disk = {}
+    if os.path.exists(generated_dir):
+        for entry in os.scandir(generated_dir):
+            extension = os.path.splitext(entry.name)[1]
+            if entry.is_file() and extension in EXTENSION_FORMATS:
+                on_disk[entry.name] = entry
+    
+    for audio_file in AudioFile.query.all():
+        entry = on_disk.pop(audio_file.filename, None)
+        if entry is None:
+            report['removed'].append(audio_file.filename)
+            if not dry_run:
+                db.session.delete(audio_file)
+        elif entry.stat().st_size != audio_file.size_bytes:
+            report['updated'].append(audio_file.filename)
+            if not dry_run:
+                audio_file.size_bytes = entry.stat().st_size
+                audio_file.checksum = file_checksum(entry.path)
+    
+    for filename, entry in on_disk.items():
+        report['added'].append(filename)
+        if not dry_run:
+            record_audio_file(
+                filename,
+                entry.stat().st_size,
+                EXTENSION_FORMATS[os.path.splitext(filename)[1]],
+                checksum=file_checksum(entry.path)
+            )
+    
+    if not dry_run:
+        db.session.commit()
+    return report
@@ -0,0 +1,410 @@
+"""
+Generation Job Queue
+Runs song generation in background worker processes so web requests return immediately
+"""
+
+import os
+import json
+import uuid
+import time
+import heapq
+import asyncio
+import cProfile
+import threading
+import multiprocessing
+from itertools import count
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import metrics
+from admission import check_memory, check_wait, estimate_cost
+from render_cache import RenderCache
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_COMPLETED = 'completed'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+JOB_FINISHED = (JOB_COMPLETED, JOB_FAILED, JOB_CANCELLED)
+
+# Returned by an on_complete callback that will call GenerationQueue.complete itself
+COMPLETE_LATER = object()
+
+
+class JobStore:
+    """Job records kept as small JSON files so every web worker can report on any job"""
+
+    def __init__(self, jobs_dir):
+        self.jobs_dir = jobs_dir
+        os.makedirs(jobs_dir, exist_ok=True)
+
+    def _path(self, job_id):
+        return os.path.join(self.jobs_dir, f"{job_id}.json")
+
+    def save(self, job):
+        # Write to a temp file and rename so readers never see a partial record
+        path = self._path(job['id'])
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(job, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+        return job
+
+    def load(self, job_id):
+        try:
+            with open(self._path(job_id), encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def update(self, job_id, **fields):
+        # Not locked: a record has one writer at a time (its worker while it runs, the
+        # queue otherwise), and cancellation is flagged in a marker file instead
+        job = self.load(job_id) or {'id': job_id}
+        job.update(fields)
+        job['updated_at'] = datetime.utcnow().isoformat()
+        return self.save(job)
+
+    def _cancel_path(self, job_id):
+        return os.path.join(self.jobs_dir, f"{job_id}.cancel")
+
+    def request_cancel(self, job_id):
+        """Flag a job as cancelled in a marker file, which no job record write can overwrite"""
+        with open(self._cancel_path(job_id), 'w'):
+            pass
+
+    def cancel_requested(self, job_id):
+        return os.path.exists(self._cancel_path(job_id))
+
+    def prune(self, max_age_seconds):
+        """Remove job records older than max_age_seconds"""
+        cutoff = time.time() - max_age_seconds
+        for filename in os.listdir(self.jobs_dir):
+            path = os.path.join(self.jobs_dir, filename)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+
+def worker_context():
+    """Multiprocessing context for worker pools created while requests are in flight.
+
+    Forked workers would inherit open pipes such as an in-process encode's ffmpeg
+    stdin and keep ffmpeg from ever seeing EOF, so start them from a clean forkserver.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+# Per-process state for pool workers
+_worker_generator = None
+_worker_loop = None
+_worker_caches = {}
+
+
+def _init_worker():
+    """Build one generator and event loop per worker process"""
+    global _worker_generator, _worker_loop
+    from music_generator import ArabicMusicGenerator
+
+    _worker_generator = ArabicMusicGenerator()
+    _worker_generator.prewarm_note_bank()
+    _worker_loop = asyncio.new_event_loop()
+
+
+def _run_job(job_id, jobs_dir, params):
+    """Generate one song inside a worker process"""
+    store = JobStore(jobs_dir)
+    job = store.update(job_id, status=JOB_RUNNING, stage='starting', progress=0.0,
+                       started_at=datetime.utcnow().isoformat())
+    queue_wait = 0.0
+    if job.get('created_at'):
+        queue_wait = (datetime.fromisoformat(job['started_at']) - datetime.fromisoformat(job['created_at'])).total_seconds()
+
+    def check_cancelled():
+        # Called between render blocks, so a cancel stops the mix, effects and encode
+        if store.cancel_requested(job_id):
+            raise RuntimeError('Job cancelled')
+
+    if store.cancel_requested(job_id):
+        return {'success': False, 'cancelled': True, 'error': 'Job cancelled', 'stages': {}}
+
+    def report_progress(stage, fraction):
+        store.update(job_id, stage=stage, progress=round(fraction, 2))
+
+    params = dict(params)
+    profile = params.pop('profile', False)
+    cache_dir = params.pop('cache_dir', None)
+    if cache_dir:
+        if cache_dir not in _worker_caches:
+            _worker_caches[cache_dir] = RenderCache(cache_dir)
+        params['render_cache'] = _worker_caches[cache_dir]
+
+    profiler = cProfile.Profile() if profile else None
+    if profiler:
+        profiler.enable()
+    generation_start = time.time()
+    try:
+        result = _worker_loop.run_until_complete(
+            _worker_generator.generate_song(progress_callback=report_progress, check_cancelled=check_cancelled, **params)
+        )
+    finally:
+        if profiler:
+            profiler.disable()
+    result['generation_time'] = time.time() - generation_start
+    if store.cancel_requested(job_id):
+        # Cancelled after the last block: drop the file so nothing records it
+        if result['success'] and os.path.exists(result['file_path']):
+            os.remove(result['file_path'])
+        result['cancelled'] = True
+    if profiler:
+        result['profile_path'] = metrics.dump_profile(profiler, f"job_{job_id}")
+
+    # Stage timings travel back in the result so the parent process can record them
+    result.setdefault('stages', {})['queue_wait'] = {
+        'seconds': round(queue_wait, 6), 'cpu_seconds': 0.0, 'peak_bytes': 0, 'calls': 1
+    }
+    return result
+
+
+class GenerationQueue:
+    """Shortest-job-first queue of generation jobs feeding a pool of worker processes.
+
+    Jobs are ordered by submission time plus cost_weight times their estimated CPU
+    seconds, so short renders overtake long ones but a long render is never passed
+    over for ever. Running jobs share a memory budget on top of the worker count.
+    """
+
+    def __init__(self, jobs_dir, max_workers=None, memory_budget=None, cost_weight=None):
+        self.store = JobStore(jobs_dir)
+        self.store.prune(int(os.environ.get('JOB_RETENTION_SECONDS', 7 * 24 * 3600)))
+        self.max_workers = max_workers or int(os.environ.get('GENERATION_WORKERS', os.cpu_count() or 1))
+        self.memory_budget = memory_budget or int(os.environ.get('GENERATION_MEMORY_BUDGET_MB', 2048)) * 1024 * 1024
+        # Seconds of queueing that one estimated CPU second of render is worth
+        self.cost_weight = cost_weight if cost_weight is not None else float(os.environ.get('SCHEDULE_COST_WEIGHT', 20))
+        self._executor = None
+        self._pending = []  # Heap of (priority, sequence, job_id, params, on_complete, batch_id, cost)
+        self._sequence = count()
+        self._running = {}
+        self._running_costs = {}
+        self._batches = {}
+        self._lock = threading.Lock()
+        metrics.registry.register(metrics.Gauge(
+            'generation_queue_jobs', 'Generation jobs waiting or running in this process',
+            lambda: {(state,): jobs for state, jobs in self.stats().items() if state in ('queued', 'running')},
+            ('state',)
+        ))
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=worker_context(),
+                                                 initializer=_init_worker)
+        return self._executor
+
+    def _new_job(self, params, info=None, batch_id=None):
+        return self.store.save({
+            **(info or {}),
+            'id': uuid.uuid4().hex,
+            'batch_id': batch_id,
+            'status': JOB_QUEUED,
+            'stage': 'queued',
+            'progress': 0.0,
+            'title': params.get('title'),
+            'created_at': datetime.utcnow().isoformat(),
+            'result': None,
+            'error': None
+        })
+
+    def _priority(self, cost):
+        return time.monotonic() + self.cost_weight * cost['cpu_seconds']
+
+    def _push_locked(self, job_id, params, on_complete, batch_id, cost):
+        heapq.heappush(self._pending, (self._priority(cost), next(self._sequence),
+                                       job_id, params, on_complete, batch_id, cost))
+
+    def _estimated_wait_locked(self, priority=float('inf')):
+        """Seconds until a job of the given priority would start, from the cost estimates"""
+        now = time.monotonic()
+        remaining = sum(max(0.0, cost['cpu_seconds'] - (now - started))
+                        for cost, started in self._running_costs.values())
+        ahead = sum(entry[6]['cpu_seconds'] for entry in self._pending if entry[0] <= priority)
+        return (remaining + ahead) / self.max_workers
+
+    def admit(self, params, check_queue=True):
+        """Estimate the cost of rendering params and check it against this queue's budgets.
+
+        Returns the estimate for submit. Raises admission.AdmissionRejected when the
+        render could never fit the memory budget (413), or when check_queue is set
+        and it would wait longer than ADMISSION_MAX_WAIT_SECONDS (429).
+        """
+        cost = estimate_cost(params)
+        check_memory(cost, self.memory_budget)
+        if check_queue:
+            with self._lock:
+                wait = self._estimated_wait_locked(self._priority(cost))
+            check_wait(wait)
+        return cost
+
+    def submit(self, params, on_complete=None, info=None, cost=None):
+        """Queue a generation job and return its record.
+
+        on_complete(job, result) runs in this process once the worker finishes and
+        may return a dict of extra fields to merge into the job result, or
+        COMPLETE_LATER to leave the job running until it calls complete(). info is
+        stored on the job record as-is. cost is the estimate from admit.
+        """
+        cost = cost or estimate_cost(params)
+        job = self._new_job(params, dict(info or {}, estimated_cost=cost))
+
+        with self._lock:
+            self._push_locked(job['id'], params, on_complete, None, cost)
+            self._dispatch_locked()
+        return job
+
+    def submit_batch(self, items, on_complete=None, on_batch_complete=None):
+        """Queue many generation jobs as one batch and return the batch record.
+
+        items is a list of (params, info) pairs. on_complete runs per successful job as
+        in submit; on_batch_complete(batch) runs once after every job has finished.
+        """
+        batch_id = uuid.uuid4().hex
+        costs = [estimate_cost(params) for params, _ in items]
+        jobs = [self._new_job(params, dict(info or {}, estimated_cost=cost), batch_id)
+                for (params, info), cost in zip(items, costs)]
+        batch = self.store.save({
+            'id': batch_id,
+            'type': 'batch',
+            'job_ids': [job['id'] for job in jobs],
+            'created_at': datetime.utcnow().isoformat()
+        })
+
+        with self._lock:
+            self._batches[batch_id] = {'remaining': len(jobs), 'on_batch_complete': on_batch_complete}
+            for job, (params, _), cost in zip(jobs, items, costs):
+                self._push_locked(job['id'], params, on_complete, batch_id, cost)
+            self._dispatch_locked()
+        return batch
+
+    def _dispatch_locked(self):
+        while self._pending and len(self._running) < self.max_workers:
+            memory = self._pending[0][6]['memory_bytes']
+            in_use = sum(cost['memory_bytes'] for cost, _ in self._running_costs.values())
+            if self._running and in_use + memory > self.memory_budget:
+                break  # The next job waits for memory, keeping its place
+            _, _, job_id, params, on_complete, batch_id, cost = heapq.heappop(self._pending)
+            future = self._get_executor().submit(_run_job, job_id, self.store.jobs_dir, params)
+            self._running[job_id] = future
+            self._running_costs[job_id] = (cost, time.monotonic())
+            future.add_done_callback(
+                lambda f, job_id=job_id, on_complete=on_complete, batch_id=batch_id:
+                    self._on_done(job_id, f, on_complete, batch_id)
+            )
+
+    def _on_done(self, job_id, future, on_complete, batch_id=None):
+        try:
+            result = future.result()
+            metrics.observe_stages(result.get('stages'))
+            if result.get('cancelled'):
+                self._mark_cancelled(job_id)
+                return
+            if not result.get('success'):
+                raise RuntimeError(result.get('error', 'Unknown error'))
+            extra = on_complete(self.store.load(job_id), result) if on_complete else None
+            if extra is COMPLETE_LATER:
+                return
+            result.update(extra or {})
+            self.complete(job_id, result)
+        except Exception as e:
+            print(f"❌ Generation job {job_id} failed: {e}")
+            metrics.generation_jobs.inc(JOB_FAILED)
+            self.store.update(job_id, status=JOB_FAILED, stage='failed', error=str(e),
+                              finished_at=datetime.utcnow().isoformat())
+        finally:
+            self._finish_job(job_id, batch_id)
+
+    def complete(self, job_id, result):
+        """Mark a job completed with its final result"""
+        self.store.update(job_id, status=JOB_COMPLETED, stage='done', progress=1.0,
+                          result=result, finished_at=datetime.utcnow().isoformat())
+        metrics.generation_jobs.inc(JOB_COMPLETED)
+
+    def _finish_job(self, job_id, batch_id):
+        """Free a finished job's slot, start the next one and complete its batch"""
+        finished_batch = None
+        with self._lock:
+            self._running.pop(job_id, None)
+            self._running_costs.pop(job_id, None)
+            if batch_id in self._batches:
+                self._batches[batch_id]['remaining'] -= 1
+                if self._batches[batch_id]['remaining'] == 0:
+                    finished_batch = self._batches.pop(batch_id)
+            self._dispatch_locked()
+        if finished_batch and finished_batch['on_batch_complete']:
+            finished_batch['on_batch_complete'](self.get_batch(batch_id))
+
+    def _mark_cancelled(self, job_id):
+        print(f"🛑 Generation job {job_id} cancelled")
+        metrics.generation_jobs.inc(JOB_CANCELLED)
+        self.store.update(job_id, status=JOB_CANCELLED, stage='cancelled',
+                          finished_at=datetime.utcnow().isoformat())
+
+    def cancel(self, job_id):
+        """Cancel an unfinished job and return its record.
+
+        A job still waiting in this process is dropped at once. Otherwise a cancel
+        marker is left next to the job record, and its worker stops before rendering
+        or at its next block; this covers jobs queued by other web processes too.
+        """
+        with self._lock:
+            entry = next((entry for entry in self._pending if entry[2] == job_id), None)
+            if entry is not None:
+                self._pending.remove(entry)
+                heapq.heapify(self._pending)
+        self.store.request_cancel(job_id)
+        if entry is not None:
+            self._mark_cancelled(job_id)
+            self._finish_job(job_id, entry[5])
+        return self.get(job_id)
+
+    def get(self, job_id):
+        job = self.store.load(job_id)
+        if job and self.store.cancel_requested(job_id):
+            job['cancel_requested'] = True
+        if job and job['status'] == JOB_QUEUED:
+            job['queue_position'] = self.queue_position(job_id)
+        return job
+
+    def queue_position(self, job_id):
+        with self._lock:
+            for position, entry in enumerate(sorted(self._pending), start=1):
+                if entry[2] == job_id:
+                    return position
+        return None
+
+    def get_batch(self, batch_id):
+        """Batch record with per-item job states and a status summary"""
+        batch = self.store.load(batch_id)
+        if not batch or batch.get('type') != 'batch':
+            return None
+        jobs = [self.store.load(job_id) or {'id': job_id, 'status': JOB_FAILED} for job_id in batch['job_ids']]
+        counts = {state: 0 for state in (JOB_QUEUED, JOB_RUNNING) + JOB_FINISHED}
+        for job in jobs:
+            counts[job['status']] += 1
+        batch['jobs'] = jobs
+        batch['counts'] = counts
+        batch['finished'] = sum(counts[state] for state in JOB_FINISHED) == len(jobs)
+        return batch
+
+    def stats(self):
+        with self._lock:
+            return {
+                'queued': len(self._pending),
+                'running': len(self._running),
+                'workers': self.max_workers,
+                'estimated_wait_seconds': round(self._estimated_wait_locked(), 1),
+                'memory_in_use_mb': round(sum(cost['memory_bytes'] for cost, _ in self._running_costs.values())
+                                          / (1024 * 1024), 1),
+                'memory_budget_mb': round(self.memory_budget / (1024 * 1024), 1)
+            }
@@ -0,0 +1,31 @@
+"""
+Gunicorn hooks
+Apply migrations once in the master, and pre-warm the DSP stack in render workers
+
+Read automatically when gunicorn starts from this directory, e.g.
+
+    SERVER_ROLE=api gunicorn app:app
+    SERVER_ROLE=render gunicorn app:app --workers 2
+"""
+
+import startup
+
+
+def on_starting(server):
+    """Runs once in the master before any worker boots"""
+    if startup.migrate_on_start():
+        from migrations import migrate
+
+        migrate()
+
+
+def post_fork(server, worker):
+    # The master imported startup long before this worker existed
+    startup.report.reset()
+
+
+def post_worker_init(worker):
+    """Runs in each worker once the app is imported, before it accepts requests"""
+    if startup.server_role() == startup.ROLE_RENDER:
+        startup.preload_render_stack()
+        startup.report.print_report()
@@ -0,0 +1,40 @@
+"""
+Iqa'at
+Library of Arabic rhythmic cycles as beat positions, importable without the numpy rendering stack
+"""
+
+# Rhythmic cycles: length in beats and strokes as (beat position, instrument)
+IQAAT = {
+    # The original 8-beat style patterns, a dum on every marked beat
+    'classical': {'beats': 8, 'strokes': ((0, 'dum'), (2, 'dum'), (4, 'dum'), (6, 'dum'))},
+    'folk': {'beats': 8, 'strokes': ((0, 'dum'), (2, 'dum'), (3, 'dum'), (5, 'dum'), (7, 'dum'))},
+    'modern': {'beats': 8, 'strokes': ((0, 'dum'), (3, 'dum'), (5, 'dum'))},
+    'traditional': {'beats': 8, 'strokes': ((0, 'dum'), (2, 'dum'), (5, 'dum'), (6, 'dum'))},
+
+    # Classical iqa'at in 4/4 (D T - T D - T -, etc.) and sama'i thaqil in 10/8
+    'maqsum': {'beats': 4, 'strokes': ((0, 'dum'), (0.5, 'tak'), (1.5, 'tak'), (2, 'dum'), (3, 'tak'))},
+    'baladi': {'beats': 4, 'strokes': ((0, 'dum'), (0.5, 'dum'), (1.5, 'tak'), (2, 'dum'), (3, 'tak'))},
+    'saidi': {'beats': 4, 'strokes': ((0, 'dum'), (0.5, 'tak'), (1.5, 'dum'), (2, 'dum'), (3, 'tak'))},
+    'wahda': {'beats': 4, 'strokes': ((0, 'dum'), (1.5, 'tak'), (2.5, 'tak'))},
+    'samai': {'beats': 5, 'strokes': ((0, 'dum'), (1.5, 'tak'), (2.5, 'dum'), (3, 'dum'), (3.5, 'tak'))}
+}
+
+# Cycle used for a style unless the request names an iqa'a
+STYLE_IQAAT = {
+    'classical': 'classical',
+    'folk': 'folk',
+    'modern': 'modern',
+    'traditional': 'traditional'
+}
+
+
+def iqa_for_style(style):
+    return STYLE_IQAAT.get(style, 'modern')
+
+
+def describe_iqa(name):
+    """JSON-friendly description of a cycle, as stored in render manifests"""
+    if name not in IQAAT:
+        raise ValueError(f"Unknown iqa'a: {name}")
+    cycle = IQAAT[name]
+    return {'iqa': name, 'beats': cycle['beats'], 'strokes': [list(stroke) for stroke in cycle['strokes']]}
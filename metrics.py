@@ -0,0 +1,251 @@
+"""
+Metrics
+Per-stage generation instrumentation and a Prometheus-style /metrics endpoint
+"""
+
+import os
+import time
+import cProfile
+import threading
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+BYTES_BUCKETS = tuple(2 ** power for power in range(16, 33, 2))  # 64 KB .. 4 GB
+
+
+def format_labels(labelnames, values):
+    if not labelnames:
+        return ''
+    pairs = ','.join(f'{name}="{value}"' for name, value in zip(labelnames, values))
+    return '{' + pairs + '}'
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Gauge:
+    """Gauge read from a callback at scrape time"""
+
+    def __init__(self, name, documentation, callback, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.labelnames = labelnames
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        for labels, value in sorted(self.callback().items()):
+            lines.append(f"{self.name}{format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.setdefault(labels, {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0})
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['counts'][index] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series['counts']):
+                    bucket_labels = format_labels(self.labelnames + ('le',), labels + (bound,))
+                    lines.append(f"{self.name}_bucket{bucket_labels} {count}")
+                inf_labels = format_labels(self.labelnames + ('le',), labels + ('+Inf',))
+                lines.append(f"{self.name}_bucket{inf_labels} {series['count']}")
+                lines.append(f"{self.name}_sum{format_labels(self.labelnames, labels)} {series['sum']}")
+                lines.append(f"{self.name}_count{format_labels(self.labelnames, labels)} {series['count']}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics)
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+stage_seconds = registry.register(Histogram(
+    'generation_stage_seconds', 'Wall-clock time per generation stage', ('stage',)))
+stage_cpu_seconds = registry.register(Histogram(
+    'generation_stage_cpu_seconds', 'CPU time per generation stage', ('stage',)))
+stage_peak_bytes = registry.register(Histogram(
+    'generation_stage_peak_array_bytes', 'Largest array allocated by a generation stage', ('stage',), BYTES_BUCKETS))
+generation_jobs = registry.register(Counter(
+    'generation_jobs_total', 'Finished generation jobs by outcome', ('status',)))
+http_requests = registry.register(Counter(
+    'http_requests_total', 'HTTP requests by route, method and status', ('route', 'method', 'status')))
+http_errors = registry.register(Counter(
+    'http_request_errors_total', 'HTTP 5xx responses by route', ('route', 'method')))
+http_latency = registry.register(Histogram(
+    'http_request_seconds', 'HTTP request latency by route', ('route', 'method')))
+
+
+class StageRecorder:
+    """Accumulates exclusive wall time, CPU time and peak array size per named stage.
+
+    Stages may nest (the encoder pulls blocks through the mix and effects stages);
+    time spent in a nested stage is not counted again in its parent.
+    """
+
+    def __init__(self):
+        self.totals = {}
+        self._stack = []
+
+    def _entry(self, name):
+        return self.totals.setdefault(name, {'seconds': 0.0, 'cpu_seconds': 0.0, 'peak_bytes': 0, 'calls': 0})
+
+    @contextmanager
+    def stage(self, name):
+        frame = {'wall': time.perf_counter(), 'cpu': time.process_time(), 'child_wall': 0.0, 'child_cpu': 0.0}
+        self._stack.append(frame)
+        try:
+            yield self
+        finally:
+            self._stack.pop()
+            wall = time.perf_counter() - frame['wall']
+            cpu = time.process_time() - frame['cpu']
+            entry = self._entry(name)
+            entry['seconds'] += wall - frame['child_wall']
+            entry['cpu_seconds'] += cpu - frame['child_cpu']
+            entry['calls'] += 1
+            if self._stack:
+                self._stack[-1]['child_wall'] += wall
+                self._stack[-1]['child_cpu'] += cpu
+
+    def track(self, name, array):
+        """Record an array produced by a stage; keeps the largest size seen"""
+        entry = self._entry(name)
+        entry['peak_bytes'] = max(entry['peak_bytes'], array.nbytes)
+        return array
+
+    def merge(self, summary):
+        """Add another recorder's summary (e.g. from a worker process) into this one"""
+        for name, other in summary.items():
+            entry = self._entry(name)
+            entry['seconds'] += other['seconds']
+            entry['cpu_seconds'] += other['cpu_seconds']
+            entry['peak_bytes'] = max(entry['peak_bytes'], other['peak_bytes'])
+            entry['calls'] += other['calls']
+
+    def summary(self):
+        return {
+            name: {
+                'seconds': round(entry['seconds'], 6),
+                'cpu_seconds': round(entry['cpu_seconds'], 6),
+                'peak_bytes': entry['peak_bytes'],
+                'calls': entry['calls']
+            }
+            for name, entry in self.totals.items()
+        }
+
+
+def observe_stages(stages):
+    """Feed a StageRecorder summary (possibly from a worker process) into the histograms"""
+    for name, entry in (stages or {}).items():
+        stage_seconds.observe(entry['seconds'], name)
+        stage_cpu_seconds.observe(entry['cpu_seconds'], name)
+        if entry['peak_bytes']:
+            stage_peak_bytes.observe(entry['peak_bytes'], name)
+
+
+@contextmanager
+def observe_stage(name):
+    """Time a single stage in this process and record it directly"""
+    recorder = StageRecorder()
+    with recorder.stage(name):
+        yield recorder
+    observe_stages(recorder.summary())
+
+
+def profiling_enabled():
+    return os.environ.get('ENABLE_PROFILING') == '1'
+
+
+def profile_dir():
+    path = os.environ.get('PROFILE_DIR', 'profiles')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def dump_profile(profiler, label):
+    """Write cProfile stats to PROFILE_DIR for later inspection with pstats/snakeviz"""
+    safe_label = ''.join(c if c.isalnum() or c in '-_' else '_' for c in label)
+    path = os.path.join(profile_dir(), f"{time.strftime('%Y%m%d-%H%M%S')}_{safe_label}_{os.getpid()}.prof")
+    profiler.dump_stats(path)
+    return path
+
+
+def init_app(app):
+    """Count requests and errors by route, optionally profile them, and serve /metrics"""
+    from flask import request, g, Response
+
+    @app.before_request
+    def start_request_metrics():
+        g.metrics_start = time.perf_counter()
+        if profiling_enabled() and (request.args.get('profile') == '1' or request.headers.get('X-Profile') == '1'):
+            g.profiler = cProfile.Profile()
+            g.profiler.enable()
+
+    @app.after_request
+    def record_request_metrics(response):
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        if 'metrics_start' in g:
+            http_latency.observe(time.perf_counter() - g.metrics_start, route, request.method)
+        http_requests.inc(route, request.method, str(response.status_code))
+        if response.status_code >= 500:
+            http_errors.inc(route, request.method)
+
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            response.headers['X-Profile-Path'] = dump_profile(profiler, route.strip('/') or 'index')
+        return response
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Migrations
+Versioned, idempotent schema migrations for the app database, with batched backfills
+
+    python migrations.py            # apply pending migrations
+    python migrations.py --status   # list applied and pending migrations
+
+Applied versions are recorded in the schema_version table. Every step checks the
+live schema before changing it, so a migration interrupted halfway (or raced by
+another worker starting up) can simply be run again.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import datetime
+
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.exc import IntegrityError
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database_config import database_url, engine_options
+from src.models.song import db
+
+# Rows per backfill transaction, and the pause between batches that lets other writers in
+BACKFILL_BATCH_SIZE = int(os.environ.get('MIGRATION_BATCH_SIZE', 1000))
+BACKFILL_PAUSE = int(os.environ.get('MIGRATION_BATCH_PAUSE_MS', 10)) / 1000
+
+MIGRATIONS = []
+
+
+def migration(version, name):
+    """Register func(engine) as migration version"""
+    def register(func):
+        MIGRATIONS.append((version, name, func))
+        return func
+    return register
+
+
+def column_names(connection, table):
+    return {column['name'] for column in inspect(connection).get_columns(table)}
+
+
+def add_column(engine, table, name, ddl_type):
+    """Add a nullable column unless it exists; a lone ADD COLUMN does not rewrite the table"""
+    with engine.connect() as connection:
+        if name in column_names(connection, table):
+            return
+    try:
+        with engine.begin() as connection:
+            connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl_type}"))
+        print(f"✅ Added column {table}.{name}")
+    except Exception:
+        # Another process may have added it between the check and the ALTER
+        with engine.connect() as connection:
+            if name not in column_names(connection, table):
+                raise
+
+
+def create_index(engine, index):
+    """Create a model index unless it exists, without blocking writes where the database allows"""
+    if engine.dialect.name == 'postgresql':
+        # CONCURRENTLY keeps the table writable but cannot run inside a transaction
+        columns = ', '.join(column.name for column in index.columns)
+        unique = 'UNIQUE ' if index.unique else ''
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            connection.execute(text(
+                f"CREATE {unique}INDEX CONCURRENTLY IF NOT EXISTS {index.name} ON {index.table.name} ({columns})"
+            ))
+    else:
+        with engine.begin() as connection:
+            index.create(connection, checkfirst=True)
+
+
+def backfill(engine, table, columns, targets, compute, batch_size=None):
+    """Fill targets for every row of table, one short transaction per batch.
+
+    Rows are walked in primary key order; compute(row) gets the id and columns of a
+    row and returns a dict of target values, or None to leave the row alone.
+    Returns the number of rows updated.
+    """
+    batch_size = batch_size or BACKFILL_BATCH_SIZE
+    select = text(f"SELECT id, {', '.join(columns)} FROM {table} WHERE id > :last_id ORDER BY id LIMIT :limit")
+    update = text(f"UPDATE {table} SET {', '.join(f'{name} = :{name}' for name in targets)} WHERE id = :id")
+
+    last_id = 0
+    updated = 0
+    while True:
+        with engine.begin() as connection:
+            rows = connection.execute(select, {'last_id': last_id, 'limit': batch_size}).mappings().all()
+            if not rows:
+                break
+            changes = []
+            for row in rows:
+                values = compute(row)
+                if values is not None:
+                    changes.append(dict(values, id=row['id']))
+            if changes:
+                connection.execute(update, changes)
+            updated += len(changes)
+            last_id = rows[-1]['id']
+        time.sleep(BACKFILL_PAUSE)
+    return updated
+
+
+@migration(1, 'create_tables')
+def create_tables(engine):
+    # Only creates missing tables; later migrations bring existing ones up to date
+    db.metadata.create_all(engine)
+
+
+@migration(2, 'generated_songs_generation_time')
+def generated_songs_generation_time(engine):
+    add_column(engine, 'generated_songs', 'generation_time', 'FLOAT')
+
+    def from_file_info(row):
+        if row['generation_time'] is not None or not row['file_info']:
+            return None
+        try:
+            generation_time = json.loads(row['file_info']).get('generation_time')
+        except (ValueError, AttributeError):
+            return None
+        return None if generation_time is None else {'generation_time': float(generation_time)}
+
+    count = backfill(engine, 'generated_songs', ('generation_time', 'file_info'), ('generation_time',), from_file_info)
+    print(f"✅ Backfilled generation_time for {count} song(s)")
+
+
+@migration(3, 'query_indexes')
+def query_indexes(engine):
+    # Listing filters and keyset pagination on generation_date, maqam, style, ...
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            create_index(engine, index)
+
+
+@migration(4, 'generated_songs_render_manifest')
+def generated_songs_render_manifest(engine):
+    # Older renders used an unseeded RNG and cannot be reproduced, so nothing to backfill
+    add_column(engine, 'generated_songs', 'render_manifest', 'TEXT')
+
+
+def ensure_version_table(engine):
+    with engine.begin() as connection:
+        connection.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_version ("
+            "version INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL, applied_at VARCHAR(32) NOT NULL)"
+        ))
+
+
+def applied_versions(engine):
+    with engine.connect() as connection:
+        return {row[0] for row in connection.execute(text("SELECT version FROM schema_version"))}
+
+
+def pending_migrations(engine):
+    ensure_version_table(engine)
+    applied = applied_versions(engine)
+    return [entry for entry in sorted(MIGRATIONS, key=lambda entry: entry[0]) if entry[0] not in applied]
+
+
+def get_engine():
+    url = database_url()
+    return create_engine(url, **engine_options(url))
+
+
+def migrate(engine=None):
+    """Apply pending migrations in version order; returns the versions applied"""
+    engine = engine or get_engine()
+    applied = []
+    for version, name, func in pending_migrations(engine):
+        print(f"🔧 Applying migration {version}: {name}")
+        started = time.perf_counter()
+        func(engine)
+        try:
+            with engine.begin() as connection:
+                connection.execute(
+                    text("INSERT INTO schema_version (version, name, applied_at) VALUES (:version, :name, :applied_at)"),
+                    {'version': version, 'name': name, 'applied_at': datetime.utcnow().isoformat()}
+                )
+        except IntegrityError:
+            pass  # Recorded by another process running the same migration
+        applied.append(version)
+        print(f"✅ Migration {version} applied in {time.perf_counter() - started:.2f}s")
+    return applied
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Apply versioned schema migrations to DATABASE_URL')
+    parser.add_argument('--status', action='store_true', help='List migrations without applying them')
+    args = parser.parse_args(argv)
+
+    engine = get_engine()
+    if args.status:
+        pending = {version for version, _, _ in pending_migrations(engine)}
+        for version, name, _ in sorted(MIGRATIONS, key=lambda entry: entry[0]):
+            print(f"{version:>4} {name:<40} {'pending' if version in pending else 'applied'}")
+        return 0
+
+    applied = migrate(engine)
+    print(f"🎉 Applied {len(applied)} migration(s)" if applied else "✅ Database schema is up to date")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,22 +4,70 @@ Real AI-powered music generation using OpenAI and audio processing
 """
 
 import os
+import sys
+import asyncio
+import argparse
 import numpy as np
-import librosa
-import soundfile as sf
-from pydub import AudioSegment
-from pydub.generators import Sine, Square, Sawtooth
-import random
 import json
-import requests
-from datetime import datetime
+import uuid
 import tempfile
+from functools import partial
+
+from admission import song_duration
+from audio_effects import EffectsChain
+from audio_formats import song_filename
+from audio_encoder import AudioEncoder
+from render_cache import RenderCache, composition_seed, make_render_key
+from metrics import StageRecorder
+from note_bank import NoteBank
+from parallel_render import iter_parallel_blocks
+from rhythm_engine import INSTRUMENTS, IQAAT, describe_iqa, hit_kernel, iqa_for_style, render_cycle
+from sequencer import (NOTES_PER_PHRASE, STEMS, VOICES, build_events, max_duration, note_samples, peak_bound,
+                       render_events, split_stems)
+from stem_store import stem_key
+
+# Melody (A3), a fifth above and an octave below
+VOICE_BASE_FREQS = (220, 220 * 1.5, 220 * 0.5)
+
+# Scale degrees a phrase draws from, with tonic, third and fifth favored
+DEGREE_CHOICES = (0, 1, 2, 3, 4, 5, 6, 0, 2, 4)
+
+# Distinct phrases per voice, and the orders a song's four sections play them in
+PHRASES_PER_SONG = 2
+FORMS = ((0, 0, 1, 0), (0, 1, 0, 1), (0, 1, 1, 0), (0, 0, 1, 1))
+
+# Bump when a manifest field changes meaning
+MANIFEST_VERSION = 3
 
 class ArabicMusicGenerator:
     def __init__(self):
         self.sample_rate = 44100
         self.duration = 180  # 3 minutes default
         
+        # Samples rendered per block by the streaming renderer (~1.5 s)
+        self.block_size = int(os.environ.get('RENDER_BLOCK_SIZE', 65536))
+        self.normalize_mode = os.environ.get('RENDER_NORMALIZE', 'peak')  # 'peak' or 'limiter'
+        
+        # Processes rendering time segments of one song in parallel (1 = stream in-process)
+        self.render_workers = int(os.environ.get('RENDER_WORKERS', 1))
+        
+        # Sample precision for synthesis and mixing; float32 halves render memory
+        precision = os.environ.get('AUDIO_PRECISION', 'float64')
+        if precision not in ('float32', 'float64'):
+            raise ValueError(f"Unsupported AUDIO_PRECISION: {precision}")
+        self.dtype = np.dtype(precision)
+        
+        # Output encoding (mp3, ogg, opus or flac)
+        self.audio_format = os.environ.get('AUDIO_FORMAT', 'mp3')
+        self.bitrate = os.environ.get('AUDIO_BITRATE') or None
+        
+        # Draft previews: the first PREVIEW_SECONDS of a song (0 = all of it) as a
+        # low-rate, low-bitrate MP3
+        self.preview_seconds = float(os.environ.get('PREVIEW_SECONDS', 20))
+        self.preview_sample_rate = int(os.environ.get('PREVIEW_SAMPLE_RATE', 22050))
+        self.preview_bitrate = os.environ.get('PREVIEW_BITRATE', '64k')
+        self._preview_generator = None
+        
         # Arabic Maqam frequency ratios (simplified)
         self.maqam_scales = {
             'hijaz': [1.0, 1.067, 1.333, 1.498, 1.682, 1.778, 2.0],
@@ -49,80 +97,145 @@ class ArabicMusicGenerator:
             'energetic': {'brightness': 1.3, 'rhythm_complexity': 1.0},
             'peaceful': {'brightness': 0.8, 'rhythm_complexity': 0.2}
         }
-
-    def generate_arabic_melody(self, maqam, base_freq=220, duration=8):
-        """Generate a melody using Arabic maqam scales"""
-        scale = self.maqam_scales.get(maqam, self.maqam_scales['hijaz'])
         
-        # Generate note sequence
-        notes = []
-        time_per_note = duration / 16  # 16 notes per phrase
+        # Cached per-note phase/envelope tables, keyed by note length
+        self._note_tables = {}
+        self._max_note_tables = 32
         
-        for i in range(16):
-            # Choose note from maqam scale
-            scale_degree = random.choice([0, 1, 2, 3, 4, 5, 6, 0, 2, 4])  # Favor tonic, third, fifth
-            frequency = base_freq * scale[scale_degree]
-            
-            # Generate note
-            t = np.linspace(0, time_per_note, int(self.sample_rate * time_per_note))
+        # Rendered notes, one per pitch and length, shared across songs
+        self.note_bank = NoteBank()
+
+    def get_note_tables(self, time_per_note, n_samples=None):
+        """Return cached (phase, envelope) tables for one note of the given length"""
+        if n_samples is None:
+            n_samples = int(self.sample_rate * time_per_note)
+        key = (self.sample_rate, n_samples, time_per_note)
+        tables = self._note_tables.get(key)
+        if tables is None:
+            t = np.linspace(0, time_per_note, n_samples)
             
             # Add some Arabic ornaments (microtonal bends)
             vibrato = 1 + 0.05 * np.sin(2 * np.pi * 6 * t)  # 6Hz vibrato
-            note = np.sin(2 * np.pi * frequency * t * vibrato)
+            phase = 2 * np.pi * t * vibrato
             
-            # Apply envelope
-            envelope = np.exp(-3 * t / time_per_note)  # Exponential decay
-            note *= envelope
+            # Exponential decay envelope
+            envelope = np.exp(-3 * t / time_per_note)
             
-            notes.append(note)
+            if len(self._note_tables) >= self._max_note_tables:
+                self._note_tables.pop(next(iter(self._note_tables)))
+            tables = (phase, envelope)
+            self._note_tables[key] = tables
+        return tables
+
+    def choose_scale_degrees(self, count, rng=None):
+        """Choose maqam scale degrees for phrases; count may be a shape such as (voices, notes)"""
+        rng = rng if rng is not None else np.random.default_rng()
+        return rng.choice(DEGREE_CHOICES, size=count)
+
+    def synthesize_notes(self, frequencies, time_per_note, n_samples=None):
+        """Render a (voices, notes) frequency array in one vectorized pass.
+        
+        Returns an array of shape (voices, notes * samples_per_note).
+        """
+        frequencies = np.asarray(frequencies, dtype=np.float64)
+        phase, envelope = self.get_note_tables(time_per_note, n_samples)
+        
+        # Preallocated (voices, notes, samples) buffer, filled in place
+        out = np.empty(frequencies.shape + phase.shape, dtype=self.dtype)
+        np.multiply(frequencies[..., np.newaxis], phase, out=out)
+        np.sin(out, out=out)
+        out *= envelope
         
-        return np.concatenate(notes)
+        return out.reshape(frequencies.shape[:-1] + (-1,))
+
+    def generate_arabic_melody(self, maqam, base_freq=220, duration=8, rng=None):
+        """Generate a melody using Arabic maqam scales"""
+        return self.generate_arabic_voices(maqam, [base_freq], duration, rng)[0]
+
+    def get_scale(self, maqam):
+        return self.maqam_scales.get(maqam, self.maqam_scales['hijaz'])
 
-    def generate_rhythm_pattern(self, tempo, style, emotion):
-        """Generate Arabic rhythm patterns (Iqa'at)"""
-        beat_duration = 60.0 / tempo
-        pattern_duration = beat_duration * 8  # 8-beat pattern
+    def get_note(self, frequency, n_samples):
+        """Return one rendered note (read-only) from the note bank"""
+        key = (float(frequency), n_samples, self.sample_rate, self.dtype.str)
         
-        # Arabic rhythm patterns
-        patterns = {
-            'classical': [1, 0, 1, 0, 1, 0, 1, 0],  # Simple 4/4
-            'folk': [1, 0, 1, 1, 0, 1, 0, 1],       # Folk pattern
-            'modern': [1, 0, 0, 1, 0, 1, 0, 0],     # Modern syncopation
-            'traditional': [1, 0, 1, 0, 0, 1, 1, 0] # Traditional Maqsum
-        }
+        def render():
+            return self.synthesize_notes([frequency], n_samples / self.sample_rate, n_samples)
         
-        pattern = patterns.get(style, patterns['modern'])
-        
-        # Generate rhythm track
-        rhythm = []
-        for beat in pattern:
-            beat_samples = int(self.sample_rate * beat_duration)
-            if beat:
-                # Generate drum hit (low frequency pulse)
-                t = np.linspace(0, beat_duration, beat_samples)
-                drum = np.sin(2 * np.pi * 60 * t) * np.exp(-10 * t)  # 60Hz drum
-                rhythm.append(drum * 0.3)  # Lower volume
-            else:
-                rhythm.append(np.zeros(beat_samples))
+        return self.note_bank.get(key, render)
+
+    def event_source(self, event):
+        """Waveform of a sequencer event at velocity 1: a banked note or a percussion hit"""
+        if event['frequency'] > 0:
+            return self.get_note(float(event['frequency']), int(event['duration']))
+        return hit_kernel(VOICES[event['voice']], self.sample_rate, self.dtype.str)
+
+    def voice_peaks(self):
+        """Peak of one source per sequencer voice; notes are enveloped sines"""
+        return [
+            float(np.max(np.abs(hit_kernel(voice, self.sample_rate, self.dtype.str)))) if voice in INSTRUMENTS else 1.0
+            for voice in VOICES
+        ]
+
+    def prewarm_note_bank(self, maqamat=None, durations=(120,)):
+        """Render the notes of common maqamat ahead of the first request.
         
-        return np.concatenate(rhythm)
+        durations are song lengths in seconds; songs play four phrases of 16 notes.
+        """
+        if maqamat is None:
+            maqamat = os.environ.get('NOTE_BANK_PREWARM', 'hijaz,bayati,rast,saba').split(',')
+        for maqam in maqamat:
+            if maqam.strip() not in self.maqam_scales:
+                continue
+            scale = np.asarray(self.maqam_scales[maqam.strip()], dtype=np.float64)
+            for duration in durations:
+                n_samples = note_samples(duration, len(FORMS[0]), self.sample_rate)
+                for base_freq in VOICE_BASE_FREQS:
+                    for frequency in base_freq * scale:
+                        self.get_note(frequency, n_samples)
 
-    def apply_arabic_effects(self, audio, emotion):
-        """Apply Arabic music characteristics and effects"""
-        params = self.emotion_params.get(emotion, self.emotion_params['happy'])
+    def generate_arabic_voices(self, maqam, base_freqs, duration=8, rng=None, degrees=None):
+        """Generate one 16-note maqam phrase per base frequency, all voices at once.
         
-        # Apply brightness (EQ simulation)
-        if params['brightness'] != 1.0:
-            # Simple high-frequency emphasis/de-emphasis
-            audio = audio * params['brightness']
+        degrees is an optional (voices, 16) array of scale degrees; without it the
+        note sequences are drawn from rng (a numpy Generator).
+        """
+        if degrees is None:
+            degrees = self.choose_scale_degrees((len(base_freqs), NOTES_PER_PHRASE), rng)
         
-        # Add reverb simulation (simple delay)
-        delay_samples = int(0.1 * self.sample_rate)  # 100ms delay
-        reverb = np.zeros_like(audio)
-        reverb[delay_samples:] = audio[:-delay_samples] * 0.3
-        audio = audio + reverb
+        # Assemble each voice by copying banked notes into a preallocated buffer
+        n_samples = note_samples(duration, 1, self.sample_rate)
+        scale = np.asarray(self.get_scale(maqam), dtype=np.float64)
+        out = np.empty((len(base_freqs), NOTES_PER_PHRASE * n_samples), dtype=self.dtype)
+        for voice, base_freq in enumerate(base_freqs):
+            notes = out[voice].reshape(NOTES_PER_PHRASE, n_samples)
+            for index, frequency in enumerate((base_freq * scale)[degrees[voice]]):
+                notes[index] = self.get_note(frequency, n_samples)
         
-        return audio
+        return out
+
+    def choose_rhythm_pattern(self, style, emotion):
+        """Pick the Arabic rhythm cycle (Iqa'a) for a style"""
+        return iqa_for_style(style)
+
+    def generate_rhythm_pattern(self, tempo, style, emotion, rhythm=None, gain=1.0):
+        """Render one loop of an Arabic rhythm pattern (Iqa'at).
+        
+        rhythm is a cycle description from rhythm_engine.describe_iqa (as stored in
+        manifests); by default the style's cycle is used.
+        """
+        if rhythm is None:
+            rhythm = describe_iqa(self.choose_rhythm_pattern(style, emotion))
+        return render_cycle(rhythm, tempo, self.sample_rate, self.dtype, gain)
+
+    def create_effects_chain(self, emotion, style='modern', region='mixed'):
+        """Per-song effects chain (brightness EQ and room reverb) carried from block to block"""
+        params = self.emotion_params.get(emotion, self.emotion_params['happy'])
+        return EffectsChain(style, region, params['brightness'], self.sample_rate)
+
+    def apply_arabic_effects(self, audio, emotion, style='modern', region='mixed'):
+        """Apply Arabic music characteristics and effects"""
+        return self.create_effects_chain(emotion, style, region).process(np.array(audio, dtype=self.dtype))
 
     def generate_ai_music_prompt(self, lyrics, maqam, style, emotion, region, tempo):
         """Generate a detailed prompt for AI music generation"""
@@ -150,7 +263,7 @@ Format: Instrumental with vocal melody suggestions"""
         
         return prompt
 
-    async def generate_with_openai_audio(self, lyrics, maqam, style, emotion, region, tempo):
+    async def generate_with_openai_audio(self, lyrics, maqam, style, emotion, region, tempo, seed=None):
         """Generate music using OpenAI's audio capabilities (when available)"""
         try:
             # Note: This is a placeholder for when OpenAI releases music generation
@@ -165,88 +278,439 @@ Format: Instrumental with vocal melody suggestions"""
             # 1. Generate procedural music based on parameters
             # 2. Use AI for enhancement and refinement
             
-            return await self.generate_procedural_music(lyrics, maqam, style, emotion, region, tempo)
+            return await self.generate_procedural_music(lyrics, maqam, style, emotion, region, tempo, seed)
             
         except Exception as e:
             print(f"OpenAI generation failed, falling back to procedural: {e}")
-            return await self.generate_procedural_music(lyrics, maqam, style, emotion, region, tempo)
+            return await self.generate_procedural_music(lyrics, maqam, style, emotion, region, tempo, seed)
 
-    async def generate_procedural_music(self, lyrics, maqam, style, emotion, region, tempo):
-        """Generate music using procedural synthesis with Arabic characteristics"""
-        print(f"🎵 Generating Arabic music: {maqam} maqam, {style} style, {emotion} emotion")
+    def build_manifest(self, lyrics, maqam, style, emotion, region, tempo, seed=None, iqa=None):
+        """Make every random choice of a render up front and record it in a manifest.
+        
+        The manifest (seed, parameters, each voice's phrases, the form the sections
+        play them in, rhythm pattern and render settings) is small and
+        JSON-serializable; plan_from_manifest turns it back into exactly the same
+        audio. iqa names a rhythm cycle from rhythm_engine.IQAAT to use instead of
+        the style's own.
+        """
+        # All random choices come from this generator so a seed reproduces the song
+        rng = np.random.default_rng(seed)
+        
+        # Calculate duration based on lyrics length (2 seconds per word)
+        estimated_duration = song_duration(lyrics)
+        
+        if maqam not in self.maqam_scales:
+            maqam = 'hijaz'
+        phrases = self.choose_scale_degrees((len(VOICE_BASE_FREQS), PHRASES_PER_SONG, NOTES_PER_PHRASE), rng)
+        form = FORMS[rng.integers(len(FORMS))]
+        
+        return {
+            'version': MANIFEST_VERSION,
+            'seed': seed,
+            'maqam': maqam,
+            'style': style,
+            'emotion': emotion,
+            'region': region,
+            'tempo': int(tempo),
+            'duration': estimated_duration,
+            'sample_rate': self.sample_rate,
+            'precision': self.dtype.name,
+            'voices': [
+                {'base_freq': base_freq, 'phrases': voice_phrases.tolist()}
+                for base_freq, voice_phrases in zip(VOICE_BASE_FREQS, phrases)
+            ],
+            'form': list(form),
+            'rhythm': describe_iqa(iqa or self.choose_rhythm_pattern(style, emotion))
+        }
+
+    def upgrade_manifest(self, manifest):
+        """Bring a manifest from an older version up to MANIFEST_VERSION"""
+        if manifest['version'] not in (1, 2, MANIFEST_VERSION):
+            raise ValueError(f"Unsupported manifest version: {manifest['version']}")
+        if manifest['version'] == 1:
+            # Version 1 stored 8 beats of on/off dums; its hits were cut off at the next beat
+            manifest = dict(manifest, rhythm={
+                'iqa': None,
+                'beats': len(manifest['rhythm_pattern']),
+                'strokes': [[beat, 'dum'] for beat, hit in enumerate(manifest['rhythm_pattern']) if hit]
+            })
+        if manifest['version'] < 3:
+            # Versions 1 and 2 looped one phrase per voice over the whole song
+            manifest = dict(manifest, form=[0, 0, 0, 0], voices=[
+                {'base_freq': voice['base_freq'], 'phrases': [voice['degrees']]} for voice in manifest['voices']
+            ])
+        return manifest
+
+    def plan_from_manifest(self, manifest, stages=None, seconds=None, draft=False):
+        """Sequence the notes and strokes of the song recorded in manifest.
+        
+        The plan holds the song as a sequencer event array (a few KB) rather than
+        audio; iter_procedural_blocks renders it block by block from banked notes and
+        hits. Stage timings are collected in stages (a metrics.StageRecorder), which
+        travels with the plan. seconds limits the plan to the start of the song, and
+        draft renders at this generator's sample rate whatever the manifest's.
+        """
+        stages = stages or StageRecorder()
+        manifest = self.upgrade_manifest(manifest)
+        if not draft and (manifest['sample_rate'], manifest['precision']) != (self.sample_rate, self.dtype.name):
+            raise ValueError(f"Manifest was rendered at {manifest['sample_rate']} Hz in {manifest['precision']}, "
+                             f"not {self.sample_rate} Hz in {self.dtype.name}")
+        
+        with stages.stage('sequence'):
+            events = stages.track('sequence', build_events(
+                manifest, self.get_scale(manifest['maqam']), self.sample_rate
+            ))
+        
+        total_samples = int(manifest['duration'] * self.sample_rate)
+        if seconds:
+            total_samples = min(total_samples, int(seconds * self.sample_rate))
+        
+        return {
+            'total_samples': total_samples,
+            'events': events,
+            'stem_events': split_stems(events),
+            'max_event_samples': max_duration(events),
+            'emotion': manifest['emotion'],
+            'style': manifest['style'],
+            'region': manifest['region'],
+            'manifest': manifest,
+            'stages': stages
+        }
+
+    def plan_procedural_music(self, lyrics, maqam, style, emotion, region, tempo, seed=None, stages=None, iqa=None):
+        """Choose a song's notes from seed and sequence them (see plan_from_manifest)"""
+        manifest = self.build_manifest(lyrics, maqam, style, emotion, region, tempo, seed, iqa)
+        return self.plan_from_manifest(manifest, stages)
+
+    def render_stem(self, plan, events, start=0, stop=None):
+        """Render samples [start, stop) of one stem's events into a new buffer"""
+        stop = plan['total_samples'] if stop is None else stop
+        out = np.zeros(stop - start, dtype=self.dtype)
+        return render_events(events, start, stop, out, self.event_source, plan['max_event_samples'])
+
+    def attach_stems(self, plan, stem_store):
+        """Mix plan from stored stems, rendering only the stems whose events are new"""
+        plan['stems'] = [
+            stem_store.get(
+                stem_key(name, events, plan['total_samples'], self.sample_rate, self.dtype),
+                partial(self.render_stem, plan, events)
+            )
+            for name, events in zip(STEMS, plan['stem_events'])
+        ]
+        return plan
+
+    def render_block(self, plan, start, stop):
+        """Mix samples [start, stop) of a planned song, before effects.
+        
+        Stems are summed in the same order whether they come from the stem store or
+        are rendered here, so both give identical samples.
+        """
+        block = np.zeros(stop - start, dtype=self.dtype)
+        if plan.get('stems'):
+            for stem in plan['stems']:
+                block += stem[start:stop]
+        else:
+            for events in plan['stem_events']:
+                block += self.render_stem(plan, events, start, stop)
+        return block
+
+    def aligned_block_size(self, effects):
+        """Render block size rounded up to whole effects partitions"""
+        return -(-self.block_size // effects.partition_size) * effects.partition_size
+
+    def iter_mixed_blocks(self, plan, start=0, stop=None):
+        """Yield mixed blocks with effects applied for samples [start, stop).
         
-        # Calculate duration based on lyrics length
-        estimated_duration = max(120, min(300, len(lyrics.split()) * 2))  # 2 seconds per word
+        A segment that starts mid-song first runs the preceding reverb tail through
+        the effects chain, so its output matches a render from the beginning.
+        """
+        stages = plan['stages']
+        check_cancelled = plan.get('check_cancelled')
+        stop = plan['total_samples'] if stop is None else stop
+        effects = self.create_effects_chain(plan['emotion'], plan['style'], plan['region'])
+        block_size = self.aligned_block_size(effects)
+        if start % effects.partition_size:
+            raise ValueError(f"Segment start {start} is not a multiple of {effects.partition_size}")
         
-        # Generate base melody
-        base_freq = 220  # A3
-        melody = self.generate_arabic_melody(maqam, base_freq, estimated_duration / 4)
+        with stages.stage('effects_preroll'):
+            for block_start in range(max(0, start - effects.tail_samples), start, block_size):
+                effects.process(self.render_block(plan, block_start, min(block_start + block_size, start)))
         
-        # Generate harmony (fifth and octave)
-        harmony1 = self.generate_arabic_melody(maqam, base_freq * 1.5, estimated_duration / 4)
-        harmony2 = self.generate_arabic_melody(maqam, base_freq * 0.5, estimated_duration / 4)
+        for block_start in range(start, stop, block_size):
+            if check_cancelled:
+                check_cancelled()
+            block_stop = min(block_start + block_size, stop)
+            with stages.stage('mix'):
+                block = stages.track('mix', self.render_block(plan, block_start, block_stop))
+            with stages.stage('effects'):
+                effects.process(block)
+            yield block
+
+    def limiter_peak(self, plan):
+        """Upper bound on the peak of a planned song after effects"""
+        gain_bound = self.create_effects_chain(plan['emotion'], plan['style'], plan['region']).gain_bound
+        return peak_bound(plan['events'], self.voice_peaks()) * gain_bound
+
+    def iter_procedural_blocks(self, plan, normalize=None, pcm=False):
+        """Yield the finished song in fixed-size blocks.
         
-        # Generate rhythm
-        rhythm_pattern = self.generate_rhythm_pattern(tempo, style, emotion)
+        normalize='peak' finds the exact peak while spilling the mix to a scratch
+        file, so output matches a whole-buffer normalization; normalize='limiter'
+        streams straight through, scaled by a fixed bound on the mix and effects
+        gain that can never clip.
+        With pcm=True blocks are converted straight to 16-bit PCM for the encoder.
+        With render_workers > 1, time segments are rendered across a process pool.
+        """
+        if self.render_workers > 1:
+            yield from iter_parallel_blocks(self, plan, self.render_workers, normalize, pcm)
+            return
         
-        # Extend patterns to full duration
-        melody_full = np.tile(melody, int(estimated_duration / len(melody) * self.sample_rate) + 1)[:int(estimated_duration * self.sample_rate)]
-        harmony1_full = np.tile(harmony1, int(estimated_duration / len(harmony1) * self.sample_rate) + 1)[:int(estimated_duration * self.sample_rate)]
-        harmony2_full = np.tile(harmony2, int(estimated_duration / len(harmony2) * self.sample_rate) + 1)[:int(estimated_duration * self.sample_rate)]
-        rhythm_full = np.tile(rhythm_pattern, int(estimated_duration / len(rhythm_pattern) * self.sample_rate) + 1)[:int(estimated_duration * self.sample_rate)]
+        stages = plan['stages']
+        if (normalize or self.normalize_mode) == 'peak':
+            yield from self.iter_peak_normalized_blocks(plan, pcm)
+            return
         
-        # Mix all elements
-        final_audio = (melody_full * 0.4 + 
-                      harmony1_full * 0.2 + 
-                      harmony2_full * 0.2 + 
-                      rhythm_full * 0.2)
+        with stages.stage('normalize'):
+            peak = self.limiter_peak(plan)
+        for block in self.iter_mixed_blocks(plan):
+            with stages.stage('normalize'):
+                block = self.normalize_block(block, peak, pcm)
+            yield block
+    
+    def iter_peak_normalized_blocks(self, plan, pcm=False):
+        """Render the song once into a scratch file while finding its peak, then rescale it from there.
+        
+        Reading the mixed blocks back costs far less than mixing and running the
+        effects a second time, and the file lives in the page cache rather than in
+        process memory (RENDER_SPILL_DIR, default the system temp directory).
+        """
+        stages = plan['stages']
+        with tempfile.TemporaryFile(dir=os.environ.get('RENDER_SPILL_DIR')) as spill:
+            peak = 0.0
+            sizes = []
+            for block in self.iter_mixed_blocks(plan):
+                with stages.stage('normalize'):
+                    peak = max(peak, float(block.max()), float(-block.min()))
+                    block.tofile(spill)
+                    sizes.append(len(block))
+            
+            spill.seek(0)
+            for size in sizes:
+                with stages.stage('normalize'):
+                    block = self.normalize_block(np.fromfile(spill, dtype=self.dtype, count=size), peak, pcm)
+                yield block
+
+    def normalize_block(self, block, peak, pcm=False):
+        """Scale a block so the song peaks at 0.8, in place or into new 16-bit PCM"""
+        if pcm:
+            # Normalized output peaks at 0.8, so no clipping is needed
+            out = np.empty(len(block), dtype='<i2')
+            np.multiply(block, 0.8 * 32767 / peak, out=out, casting='unsafe')
+            return out
+        block *= 0.8 / peak
+        return block
+
+    async def generate_procedural_music(self, lyrics, maqam, style, emotion, region, tempo, seed=None):
+        """Generate music using procedural synthesis with Arabic characteristics"""
+        print(f"🎵 Generating Arabic music: {maqam} maqam, {style} style, {emotion} emotion")
         
-        # Apply Arabic effects
-        final_audio = self.apply_arabic_effects(final_audio, emotion)
+        # Synthesis is CPU-bound, so keep it off the event loop
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, self.render_procedural_music, lyrics, maqam, style, emotion, region, tempo, seed
+        )
+
+    def render_procedural_music(self, lyrics, maqam, style, emotion, region, tempo, seed=None):
+        """Blocking body of generate_procedural_music: render the whole song into one array"""
+        plan = self.plan_procedural_music(lyrics, maqam, style, emotion, region, tempo, seed)
         
-        # Normalize
-        final_audio = final_audio / np.max(np.abs(final_audio)) * 0.8
+        final_audio = np.empty(plan['total_samples'], dtype=self.dtype)
+        position = 0
+        for block in self.iter_procedural_blocks(plan):
+            final_audio[position:position + len(block)] = block
+            position += len(block)
         
         return final_audio, self.sample_rate
 
+    def get_preview_generator(self):
+        """Generator for draft previews: same settings at PREVIEW_SAMPLE_RATE, with its own note bank"""
+        if self._preview_generator is None:
+            preview = ArabicMusicGenerator()
+            preview.sample_rate = self.preview_sample_rate
+            preview.dtype = self.dtype
+            preview.render_workers = 1
+            self._preview_generator = preview
+        return self._preview_generator
+
     def save_as_mp3(self, audio_data, sample_rate, output_path):
         """Save audio data as MP3 file"""
-        # First save as WAV
-        temp_wav = output_path.replace('.mp3', '_temp.wav')
-        sf.write(temp_wav, audio_data, sample_rate)
+        return self.save_audio(audio_data, sample_rate, output_path, 'mp3', '192k')
+
+    def save_audio(self, audio_data, sample_rate, output_path, audio_format=None, bitrate=None):
+        """Encode audio data in memory and write it atomically to output_path"""
+        encoder = AudioEncoder(audio_format or self.audio_format, bitrate or self.bitrate, sample_rate)
+        encoder.encode(audio_data, output_path)
+        return output_path
+
+    def render_key(self, lyrics, maqam, style, emotion, region, tempo, seed, encoder, iqa=None, manifest=None):
+        """Render cache key of a full-quality render; unseeded renders derive their seed from it"""
+        return make_render_key(lyrics, maqam, style, emotion, region, tempo, seed,
+                               audio_format=encoder.audio_format, bitrate=encoder.bitrate,
+                               precision=self.dtype.name, iqa=iqa, manifest=manifest)
+
+    async def generate_preview(self, title, lyrics, maqam, style, emotion, region, tempo, output_dir,
+                               seed=None, audio_format=None, bitrate=None, iqa=None, seconds=None, render_id=None):
+        """Render a quick draft of a song: its first seconds at the preview sample rate and bitrate.
         
-        # Convert to MP3 using pydub
-        audio = AudioSegment.from_wav(temp_wav)
-        audio.export(output_path, format="mp3", bitrate="192k")
+        The draft plays the same notes as generate_song with the same arguments
+        renders, since both derive an unset seed from the lyrics and maqam; the
+        manifest in the result reproduces that full render.
+        """
+        try:
+            loop = asyncio.get_running_loop()
+            seconds = self.preview_seconds if seconds is None else seconds
+            
+            render_seed = seed if seed is not None else composition_seed(lyrics, maqam)
+            
+            preview = self.get_preview_generator()
+            encoder = AudioEncoder('mp3', self.preview_bitrate, preview.sample_rate)
+            render_id = render_id or uuid.uuid4().hex[:12]
+            filename = song_filename(title, maqam, style, render_id, encoder.extension, suffix='_preview')
+            output_path = os.path.join(output_dir, filename)
+            await loop.run_in_executor(None, partial(os.makedirs, output_dir, exist_ok=True))
+            
+            stages = StageRecorder()
+            manifest = self.build_manifest(lyrics, maqam, style, emotion, region, tempo, render_seed, iqa)
+            plan = preview.plan_from_manifest(manifest, stages, seconds=seconds, draft=True)
+            # Normalized like the full render so the draft plays at the same level; the
+            # draft is short, so a peak pass costs little
+            with stages.stage('encode'):
+                encoded = await encoder.encode_blocks_async(preview.iter_procedural_blocks(plan, pcm=True), output_path)
+            
+            print(f"⚡ Preview of '{title}' - {encoded['duration_seconds']:.0f}s at {preview.sample_rate} Hz")
+            return {
+                'success': True,
+                'preview': True,
+                'file_path': encoded['path'],
+                'filename': filename,
+                'file_size_mb': round(encoded['bytes'] / (1024 * 1024), 2),
+                'duration_seconds': encoded['duration_seconds'],
+                'sample_rate': preview.sample_rate,
+                'seed': render_seed,
+                'format': encoder.audio_format,
+                'file_size_bytes': encoded['bytes'],
+                'checksum': encoded['checksum'],
+                'manifest': manifest,
+                'stages': stages.summary()
+            }
+            
+        except Exception as e:
+            print(f"❌ Preview failed for '{title}': {e}")
+            return {
+                'success': False,
+                'error': str(e)
+            }
+
+    async def generate_song(self, title, lyrics, maqam, style, emotion, region, tempo, output_dir,
+                            progress_callback=None, seed=None, render_cache=None,
+                            audio_format=None, bitrate=None, manifest=None, iqa=None, render_id=None,
+                            check_cancelled=None):
+        """Main function to generate a complete Arabic song.
         
-        # Clean up temp file
-        os.remove(temp_wav)
+        Without an explicit seed, the seed is derived from the parameters so the same
+        inputs always render the same song and can be served from render_cache.
+        With a manifest from an earlier render, that render is reproduced exactly
+        (e.g. to encode it in another format) instead of choosing notes again.
+        iqa overrides the style's rhythm cycle (see rhythm_engine.IQAAT). render_id
+        names the output file (a new one per call when unset). check_cancelled is
+        called between render blocks and raises to abandon the render.
+        
+        Blocking work (synthesis, cache file I/O) runs in the loop's default executor
+        and ffmpeg is awaited as a subprocess, so many songs can share one event loop.
+        """
+        def report_progress(stage, fraction):
+            if progress_callback:
+                progress_callback(stage, fraction)
         
-        return output_path
-
-    async def generate_song(self, title, lyrics, maqam, style, emotion, region, tempo, output_dir):
-        """Main function to generate a complete Arabic song"""
         try:
             print(f"🎼 Starting generation for '{title}'")
+            loop = asyncio.get_running_loop()
             
-            # Generate the music
-            audio_data, sample_rate = await self.generate_with_openai_audio(
-                lyrics, maqam, style, emotion, region, tempo
-            )
+            encoder = AudioEncoder(audio_format or self.audio_format, bitrate or self.bitrate, self.sample_rate)
             
             # Create output filename
-            safe_title = "".join(c for c in title if c.isalnum() or c in (' ', '-', '_')).rstrip()
-            filename = f"{safe_title}_{maqam}_{style}.mp3"
+            render_id = render_id or uuid.uuid4().hex[:12]
+            filename = song_filename(title, maqam, style, render_id, encoder.extension)
             output_path = os.path.join(output_dir, filename)
             
             # Ensure output directory exists
-            os.makedirs(output_dir, exist_ok=True)
+            await loop.run_in_executor(None, partial(os.makedirs, output_dir, exist_ok=True))
             
-            # Save as MP3
-            final_path = self.save_as_mp3(audio_data, sample_rate, output_path)
+            if manifest is not None:
+                seed = manifest['seed']
+            
+            # Serve identical requests from the render cache
+            cache_key = self.render_key(lyrics, maqam, style, emotion, region, tempo, seed, encoder, iqa, manifest)
+            if render_cache is not None:
+                cached = await loop.run_in_executor(None, render_cache.lookup, cache_key)
+                if cached:
+                    await loop.run_in_executor(None, render_cache.materialize, cache_key, output_path)
+                    print(f"⚡ Cache hit for '{title}'")
+                    return {
+                        'success': True,
+                        'file_path': output_path,
+                        'filename': filename,
+                        'file_size_mb': cached['file_size_mb'],
+                        'duration_seconds': cached['duration_seconds'],
+                        'seed': cached['seed'],
+                        'format': encoder.audio_format,
+                        'file_size_bytes': cached['file_size_bytes'],
+                        'checksum': cached['checksum'],
+                        'manifest': cached.get('manifest', manifest),
+                        'cache_key': cache_key,
+                        'cache_hit': True
+                    }
+            
+            render_seed = seed if seed is not None else composition_seed(lyrics, maqam)
+            report_progress('synthesizing', 0.05)
+            
+            # Sequence the song, then stream the mix block by block into the encoder
+            print(f"🎵 Generating Arabic music: {maqam} maqam, {style} style, {emotion} emotion")
+            stages = StageRecorder()
+            if manifest is not None:
+                plan = await loop.run_in_executor(None, self.plan_from_manifest, manifest, stages)
+            else:
+                plan = await loop.run_in_executor(
+                    None, self.plan_procedural_music, lyrics, maqam, style, emotion, region, tempo, render_seed, stages, iqa
+                )
+            plan['check_cancelled'] = check_cancelled
+            if render_cache is not None and render_cache.stems.max_bytes:
+                # Only stems whose notes or strokes changed are synthesized; a new mood
+                # or region mixes stored stems straight into the effects
+                with stages.stage('stems'):
+                    await loop.run_in_executor(None, self.attach_stems, plan, render_cache.stems)
+            report_progress('encoding', 0.3)
+            # Mix, effects and normalization run inside this stage as the encoder pulls
+            # blocks; the recorder keeps their time out of the encode figure
+            with stages.stage('encode'):
+                encoded = await encoder.encode_blocks_async(self.iter_procedural_blocks(plan, pcm=True), output_path)
+            final_path = encoded['path']
             
             # Get file size
             file_size = os.path.getsize(final_path) / (1024 * 1024)  # MB
+            duration_seconds = encoded['duration_seconds']
+            
+            if render_cache is not None:
+                with stages.stage('cache_store'):
+                    await loop.run_in_executor(None, render_cache.store, cache_key, final_path, {
+                        'file_size_mb': round(file_size, 2),
+                        'duration_seconds': duration_seconds,
+                        'seed': render_seed,
+                        'format': encoder.audio_format,
+                        'file_size_bytes': encoded['bytes'],
+                        'checksum': encoded['checksum'],
+                        'manifest': plan['manifest']
+                    })
             
             print(f"✅ Generated '{title}' - {file_size:.2f} MB")
             
@@ -255,7 +719,15 @@ Format: Instrumental with vocal melody suggestions"""
                 'file_path': final_path,
                 'filename': filename,
                 'file_size_mb': round(file_size, 2),
-                'duration_seconds': len(audio_data) / sample_rate
+                'duration_seconds': duration_seconds,
+                'seed': render_seed,
+                'format': encoder.audio_format,
+                'file_size_bytes': encoded['bytes'],
+                'checksum': encoded['checksum'],
+                'manifest': plan['manifest'],
+                'cache_key': cache_key,
+                'cache_hit': False,
+                'stages': stages.summary()
             }
             
         except Exception as e:
@@ -265,9 +737,90 @@ Format: Instrumental with vocal melody suggestions"""
                 'error': str(e)
             }
 
+# Per-process generator and event loop for batch workers
+_batch_generator = None
+_batch_loop = None
+_batch_caches = {}
+
+def generate_batch_item(item):
+    """Generate one song of a batch inside a worker process"""
+    global _batch_generator, _batch_loop
+    if _batch_generator is None:
+        _batch_generator = ArabicMusicGenerator()
+        _batch_loop = asyncio.new_event_loop()
+    
+    item = dict(item)
+    cache_dir = item.pop('cache_dir', None)
+    if cache_dir:
+        if cache_dir not in _batch_caches:
+            _batch_caches[cache_dir] = RenderCache(cache_dir)
+        item['render_cache'] = _batch_caches[cache_dir]
+    
+    result = _batch_loop.run_until_complete(_batch_generator.generate_song(**item))
+    result['title'] = item['title']
+    return result
+
+def run_batch_cli(argv=None):
+    """Generate many lyrics files in parallel across all cores, printing one JSON result per line"""
+    from concurrent.futures import ProcessPoolExecutor
+    
+    parser = argparse.ArgumentParser(description='Generate Arabic songs from many lyrics files')
+    parser.add_argument('lyrics_files', nargs='*', help='Lyrics .txt files (first line becomes the title)')
+    parser.add_argument('--items', help='JSON file with a list of per-item parameter overrides')
+    parser.add_argument('--maqam', default='hijaz')
+    parser.add_argument('--style', default='modern')
+    parser.add_argument('--emotion', default='neutral')
+    parser.add_argument('--region', default='mixed')
+    parser.add_argument('--tempo', type=int, default=120)
+    parser.add_argument('--iqa', choices=sorted(IQAAT), help="Rhythm cycle (default: the style's own)")
+    parser.add_argument('--format', dest='audio_format', default='mp3')
+    parser.add_argument('--bitrate')
+    parser.add_argument('--output-dir', default='generated_music')
+    parser.add_argument('--cache-dir', help='Render cache directory shared by the workers')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args(argv)
+    
+    overrides = []
+    if args.items:
+        with open(args.items, encoding='utf-8') as f:
+            overrides = json.load(f)
+    
+    shared = {
+        'maqam': args.maqam,
+        'style': args.style,
+        'emotion': args.emotion,
+        'region': args.region,
+        'tempo': args.tempo,
+        'iqa': args.iqa,
+        'audio_format': args.audio_format,
+        'bitrate': args.bitrate,
+        'output_dir': args.output_dir,
+        'cache_dir': args.cache_dir
+    }
+    
+    items = []
+    for index in range(max(len(args.lyrics_files), len(overrides))):
+        item = dict(shared, **(overrides[index] if index < len(overrides) else {}))
+        if index < len(args.lyrics_files):
+            with open(args.lyrics_files[index], encoding='utf-8') as f:
+                item['lyrics'] = f.read()
+        item.setdefault('lyrics', '')
+        title_line = item['lyrics'].split('\n')[0].strip()
+        item.setdefault('title', title_line[:50] or f"Generated Song {index + 1}")
+        items.append(item)
+    
+    failures = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for result in pool.map(generate_batch_item, items):
+            failures += not result['success']
+            print(json.dumps(result, ensure_ascii=False), flush=True)
+    
+    return 1 if failures else 0
+
 # Test the generator
 if __name__ == "__main__":
-    import asyncio
+    if len(sys.argv) > 1:
+        sys.exit(run_batch_cli())
     
     async def test_generation():
         generator = ArabicMusicGenerator()
@@ -0,0 +1,64 @@
+"""
+Note Bank
+Bounded LRU of pre-rendered maqam notes, so songs are mixed by copying instead of synthesizing
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+
+class NoteBank:
+    """Size-bounded LRU of rendered notes.
+
+    Each entry is one rendered note, keyed by (frequency, note_length, sample_rate,
+    precision); a song only ever plays the few dozen pitches of its maqam's scale.
+    """
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes or int(os.environ.get('NOTE_BANK_MAX_MB', 256)) * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, render):
+        """Return the notes for key, calling render() to build them on a miss"""
+        with self._lock:
+            notes = self._entries.get(key)
+            if notes is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return notes
+            self.misses += 1
+
+        notes = render()
+        notes.flags.writeable = False  # Shared by every song that mixes from it
+
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = notes
+                self._size += notes.nbytes
+            # Evict least recently used entries, but always keep the one just added
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.nbytes
+        return notes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'entries': len(self._entries),
+                'size_mb': round(self._size / (1024 * 1024), 2),
+                'max_size_mb': round(self.max_bytes / (1024 * 1024), 2)
+            }
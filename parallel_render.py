@@ -0,0 +1,150 @@
+"""
+Parallel Render
+Renders time segments of one song across a process pool into one shared memory output buffer
+"""
+
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory, util
+
+import numpy as np
+
+from generation_queue import worker_context
+from metrics import StageRecorder
+
+# Pool shared by every render in this process, created on first use
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+# Per-process generator for pool workers
+_worker_generator = None
+
+
+def _init_worker():
+    global _worker_generator
+    from music_generator import ArabicMusicGenerator
+
+    _worker_generator = ArabicMusicGenerator()
+    _worker_generator.render_workers = 1  # Workers never fan out again
+
+
+def get_pool(workers):
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=worker_context(), initializer=_init_worker)
+            _pool_workers = workers
+            # A generation worker process joins its children when it exits, so the
+            # pool must be shut down first or that worker would never finish
+            util.Finalize(_pool, _pool.shutdown, exitpriority=100)
+        return _pool
+
+
+def attach_array(descriptor):
+    """Attach to a block created by the parent process; returns (block, array view).
+
+    Pool workers share the parent's resource tracker, so attaching does not make
+    the block go away when a worker exits; the parent unlinks it.
+    """
+    block = shared_memory.SharedMemory(name=descriptor['name'])
+    return block, np.ndarray(descriptor['shape'], np.dtype(descriptor['dtype']), buffer=block.buf)
+
+
+def split_segments(total_samples, count, alignment):
+    """Split [0, total_samples) into up to count segments starting on alignment boundaries"""
+    units = -(-total_samples // alignment)
+    count = max(1, min(count, units))
+    bounds = [min(total_samples, (units * index // count) * alignment) for index in range(count + 1)]
+    return [(start, stop) for start, stop in zip(bounds, bounds[1:]) if stop > start]
+
+
+def _render_segment(task):
+    """Render one segment of a song into the shared output buffer; returns its peak"""
+    generator = _worker_generator
+    generator.sample_rate = task['sample_rate']
+    generator.dtype = np.dtype(task['dtype'])
+    generator.block_size = task['block_size']
+
+    shared, output = attach_array(task['output'])
+    plan = dict(task['plan'], stages=StageRecorder())
+    try:
+        plan['stems'] = [np.load(path, mmap_mode='r') for path in task['stem_paths']]
+    except OSError:
+        pass  # Evicted meanwhile; mixing from the events gives the same samples
+
+    peak = 0.0
+    block = None
+    position = task['start']
+    for block in generator.iter_mixed_blocks(plan, task['start'], task['stop']):
+        output[position:position + len(block)] = block
+        position += len(block)
+        peak = max(peak, float(block.max()), float(-block.min()))
+
+    stages = plan['stages'].summary()
+    # Drop every view before closing, or the buffer stays exported
+    del output, block
+    shared.close()
+    return {'peak': peak, 'stages': stages}
+
+
+def iter_parallel_blocks(generator, plan, workers, normalize=None, pcm=False):
+    """Render a planned song across workers processes and yield normalized blocks.
+
+    Each worker gets the song's event array (a few KB, sent with the task), renders
+    a contiguous time segment from its own note bank, warming its effects chain on
+    the audio just before the segment, and writes it straight into one shared output
+    buffer. Yielded blocks are fresh arrays, never views of shared memory.
+    """
+    stages = plan['stages']
+    total_samples = plan['total_samples']
+    effects = generator.create_effects_chain(plan['emotion'], plan['style'], plan['region'])
+    alignment = generator.aligned_block_size(effects)
+
+    output_block = shared_memory.SharedMemory(create=True, size=max(total_samples * generator.dtype.itemsize, 1))
+    try:
+        output = {'name': output_block.name, 'shape': (total_samples,), 'dtype': generator.dtype.str}
+
+        tasks = [{
+            'plan': {key: plan[key] for key in ('total_samples', 'events', 'stem_events', 'max_event_samples',
+                                                'emotion', 'style', 'region')},
+            # Stored stems are opened by path; a memory map would be pickled as its data
+            'stem_paths': [stem.filename for stem in plan.get('stems') or ()],
+            'output': output,
+            'start': start,
+            'stop': stop,
+            'sample_rate': generator.sample_rate,
+            'dtype': generator.dtype.str,
+            'block_size': generator.block_size
+        } for start, stop in split_segments(total_samples, workers, alignment)]
+
+        # Segments render in other processes, so a cancel is only seen before and after them
+        if plan.get('check_cancelled'):
+            plan['check_cancelled']()
+        with stages.stage('parallel_render'):
+            results = list(get_pool(workers).map(_render_segment, tasks))
+        for result in results:
+            stages.merge(result['stages'])
+
+        if (normalize or generator.normalize_mode) == 'peak':
+            peak = max(result['peak'] for result in results)
+        else:
+            peak = generator.limiter_peak(plan)
+
+        audio = np.ndarray((total_samples,), generator.dtype, buffer=output_block.buf)
+        try:
+            for start in range(0, total_samples, alignment):
+                if plan.get('check_cancelled'):
+                    plan['check_cancelled']()
+                with stages.stage('normalize'):
+                    block = audio[start:start + alignment]
+                    # PCM conversion writes a new array; float normalization is in place
+                    block = generator.normalize_block(block if pcm else block.copy(), peak, pcm)
+                yield block
+        finally:
+            block = audio = None
+    finally:
+        output_block.close()
+        output_block.unlink()
@@ -0,0 +1,180 @@
+"""
+Render Cache
+Content-addressed cache of encoded songs, keyed on the generation parameters
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import threading
+from stat import S_ISREG
+
+# Bump when the renderer or the cached metadata change in a way that makes old entries stale
+RENDER_VERSION = 7
+
+
+def make_render_key(lyrics, maqam, style, emotion, region, tempo, seed=None, **options):
+    """Hash the canonical generation parameters into a cache key"""
+    params = {
+        'version': RENDER_VERSION,
+        'lyrics': lyrics.strip(),
+        'maqam': maqam,
+        'style': style,
+        'emotion': emotion,
+        'region': region,
+        'tempo': int(tempo),
+        'seed': seed,
+        # Renders in float32 and float64 differ in the last bits
+        'precision': os.environ.get('AUDIO_PRECISION', 'float64')
+    }
+    params.update(options)
+    canonical = json.dumps(params, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def seed_from_key(key):
+    """Derive a deterministic RNG seed from a cache key"""
+    return int(key[:16], 16)
+
+
+def composition_seed(lyrics, maqam):
+    """Seed for a render without one, derived from only the inputs that shape its melody.
+
+    Renders that differ in emotion, style, region, tempo or encoding then play the
+    same notes, so their voice stems can be reused.
+    """
+    canonical = json.dumps({'version': RENDER_VERSION, 'lyrics': lyrics.strip(), 'maqam': maqam},
+                           sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return seed_from_key(hashlib.sha256(canonical.encode('utf-8')).hexdigest())
+
+
+def link_file(source_path, output_path, temp_path):
+    """Hard-link source_path to output_path through temp_path, copying across filesystems"""
+    try:
+        if os.path.samefile(source_path, output_path):
+            return  # Already linked; renaming over the same inode would leave temp_path behind
+    except OSError:
+        pass
+    try:
+        os.link(source_path, temp_path)
+    except OSError:
+        shutil.copyfile(source_path, temp_path)
+    try:
+        os.replace(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+class RenderCache:
+    """Size-bounded LRU store of rendered files under a cache directory.
+
+    Entries are hard links to the encoded file plus a small JSON sidecar with the
+    generation result, so a hit can be served without synthesis or encoding.
+    """
+
+    def __init__(self, cache_dir, max_bytes=None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes or int(os.environ.get('RENDER_CACHE_MAX_MB', 2048)) * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        self._stems = None
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @property
+    def stems(self):
+        """Per-voice stems kept next to the cache (a stem_store.StemStore)"""
+        with self._lock:
+            if self._stems is None:
+                # Imported here so API processes using the cache never load numpy
+                from stem_store import StemStore
+
+                self._stems = StemStore(os.path.join(self.cache_dir, 'stems'))
+            return self._stems
+
+    def _audio_path(self, key, extension):
+        return os.path.join(self.cache_dir, f"{key}{extension}")
+
+    def _meta_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def lookup(self, key):
+        """Return the cached result dict for key, or None on a miss"""
+        try:
+            with open(self._meta_path(key), encoding='utf-8') as f:
+                meta = json.load(f)
+            audio_path = self._audio_path(key, meta['extension'])
+            # Touch the entry so eviction treats it as recently used
+            os.utime(audio_path)
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        meta['cache_path'] = audio_path
+        return meta
+
+    def materialize(self, key, output_path):
+        """Place the cached file for key at output_path without copying data when possible"""
+        source_path = self._audio_path(key, os.path.splitext(output_path)[1])
+        link_file(source_path, output_path, f"{output_path}.{os.getpid()}.link")
+        return output_path
+
+    def store(self, key, source_path, meta):
+        """Add a rendered file to the cache and evict old entries if over budget"""
+        extension = os.path.splitext(source_path)[1]
+        audio_path = self._audio_path(key, extension)
+        link_file(source_path, audio_path, f"{audio_path}.{os.getpid()}.tmp")
+
+        meta_temp = f"{self._meta_path(key)}.{os.getpid()}.tmp"
+        with open(meta_temp, 'w', encoding='utf-8') as f:
+            json.dump(dict(meta, extension=extension), f, ensure_ascii=False)
+        os.replace(meta_temp, self._meta_path(key))
+
+        self.evict()
+
+    def _entries(self):
+        entries = []
+        for filename in os.listdir(self.cache_dir):
+            key, extension = os.path.splitext(filename)
+            if extension in ('.json', '.tmp', '.link'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, filename))
+            except OSError:
+                continue
+            if not S_ISREG(stat.st_mode):
+                continue  # The stems directory
+            entries.append((stat.st_mtime, stat.st_size, key, extension))
+        return entries
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        entries = sorted(self._entries())
+        total = sum(entry[1] for entry in entries)
+        for _, size, key, extension in entries:
+            if total <= self.max_bytes:
+                break
+            for path in (self._audio_path(key, extension), self._meta_path(key)):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+
+    def stats(self):
+        entries = self._entries()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'entries': len(entries),
+                'size_mb': round(sum(entry[1] for entry in entries) / (1024 * 1024), 2),
+                'max_size_mb': round(self.max_bytes / (1024 * 1024), 2)
+            }
@@ -0,0 +1,72 @@
+"""
+Rhythm Engine
+Iqa'at compiled to per-instrument onset arrays and rendered by scatter-adding cached hit kernels
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+# The cycle tables live apart from numpy so the API can validate requests cheaply
+from iqaat import IQAAT, STYLE_IQAAT, describe_iqa, iqa_for_style
+
+# Hit synthesis per instrument: pitch (Hz), decay rate (1/s), level and kernel length (s)
+INSTRUMENTS = {
+    'dum': {'frequency': 60.0, 'decay': 10.0, 'gain': 0.3, 'seconds': 0.6},   # Low, open center stroke
+    'tak': {'frequency': 380.0, 'decay': 45.0, 'gain': 0.2, 'seconds': 0.15}  # Sharp rim stroke
+}
+
+
+@lru_cache(maxsize=16)
+def hit_kernel(instrument, sample_rate, dtype):
+    """One rendered hit of instrument, shared by every song (read-only)"""
+    settings = INSTRUMENTS[instrument]
+    t = np.arange(int(settings['seconds'] * sample_rate)) / sample_rate
+    kernel = settings['gain'] * np.sin(2 * np.pi * settings['frequency'] * t) * np.exp(-settings['decay'] * t)
+    kernel = kernel.astype(dtype)
+    kernel.flags.writeable = False
+    return kernel
+
+
+@lru_cache(maxsize=256)
+def compile_strokes(strokes, beats, tempo, sample_rate):
+    """Compile a cycle for one tempo and sample rate.
+
+    strokes is a tuple of (beat position, instrument) pairs. Returns
+    (cycle_samples, ((instrument, onsets), ...)) with onsets as read-only sample
+    index arrays, so rendering needs no per-beat arithmetic.
+    """
+    samples_per_beat = 60.0 / tempo * sample_rate
+    cycle_samples = int(round(beats * samples_per_beat))
+    compiled = []
+    for instrument in sorted({instrument for _, instrument in strokes}):
+        positions = [position for position, name in strokes if name == instrument]
+        onsets = np.round(np.asarray(positions, dtype=np.float64) * samples_per_beat).astype(np.int64) % cycle_samples
+        onsets.flags.writeable = False
+        compiled.append((instrument, onsets))
+    return cycle_samples, tuple(compiled)
+
+
+def render_cycle(rhythm, tempo, sample_rate, dtype=np.float64, gain=1.0):
+    """Render one loopable cycle of rhythm (a describe_iqa dict) into a new buffer.
+
+    Each hit is added in place at its onset, wrapping around the end of the cycle so
+    the loop is seamless; cost grows with the number of hits, not the cycle length.
+    """
+    strokes = tuple((float(position), instrument) for position, instrument in rhythm['strokes'])
+    cycle_samples, compiled = compile_strokes(strokes, rhythm['beats'], float(tempo), sample_rate)
+
+    out = np.zeros(cycle_samples, dtype=dtype)
+    for instrument, onsets in compiled:
+        kernel = hit_kernel(instrument, sample_rate, np.dtype(dtype).str)
+        for onset in onsets:
+            position = int(onset)
+            offset = 0
+            while offset < len(kernel):
+                count = min(len(kernel) - offset, cycle_samples - position)
+                out[position:position + count] += kernel[offset:offset + count]
+                offset += count
+                position = 0
+    if gain != 1.0:
+        out *= gain
+    return out
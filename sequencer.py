@@ -0,0 +1,135 @@
+"""
+Sequencer
+Songs as compact arrays of note and stroke events, mixed block by block from banked sources
+"""
+
+import numpy as np
+
+from rhythm_engine import INSTRUMENTS, compile_strokes
+
+# One row per note or stroke: a few KB per song against ~350 KB per second of float64 audio
+EVENT_DTYPE = np.dtype([
+    ('onset', '<i8'),      # First sample, counted from the start of the song
+    ('duration', '<i4'),   # Length in samples
+    ('frequency', '<f8'),  # Pitch in Hz; 0 for strokes, which sound at their instrument's pitch
+    ('velocity', '<f4'),   # Mix level
+    ('voice', 'u1')        # Index into VOICES
+])
+
+# Melody, harmony a fifth above and an octave below, then the percussion instruments
+VOICES = ('melody', 'harmony_fifth', 'harmony_octave') + tuple(sorted(INSTRUMENTS))
+VOICE_VELOCITIES = {'melody': 0.4, 'harmony_fifth': 0.2, 'harmony_octave': 0.2, 'dum': 0.2, 'tak': 0.2}
+
+# Voices mixed into each stored stem, in mixing order
+STEMS = {
+    'melody': ('melody',),
+    'harmony1': ('harmony_fifth',),
+    'harmony2': ('harmony_octave',),
+    'rhythm': tuple(sorted(INSTRUMENTS))
+}
+
+NOTES_PER_PHRASE = 16
+
+
+def note_samples(duration, sections, sample_rate):
+    """Length in samples of one note of a song of duration seconds split into sections phrases"""
+    return int(sample_rate * (duration / sections / NOTES_PER_PHRASE))
+
+
+def note_events(manifest, scale, sample_rate):
+    """Events for every voice of a manifest, playing its phrases in the order of manifest['form']"""
+    form = manifest['form']
+    length = note_samples(manifest['duration'], len(form), sample_rate)
+    onsets = np.arange(len(form) * NOTES_PER_PHRASE, dtype=np.int64) * length
+
+    voices = []
+    for voice, spec in enumerate(manifest['voices']):
+        degrees = np.asarray(spec['phrases'])[form].ravel()
+        events = np.zeros(len(degrees), dtype=EVENT_DTYPE)
+        events['onset'] = onsets
+        events['duration'] = length
+        events['frequency'] = (spec['base_freq'] * np.asarray(scale, dtype=np.float64))[degrees]
+        events['velocity'] = VOICE_VELOCITIES[VOICES[voice]]
+        events['voice'] = voice
+        voices.append(events)
+    return voices
+
+
+def stroke_events(rhythm, tempo, total_samples, sample_rate):
+    """Events for a rhythm cycle (a describe_iqa dict) repeated over total_samples"""
+    strokes = tuple((float(position), instrument) for position, instrument in rhythm['strokes'])
+    cycle_samples, compiled = compile_strokes(strokes, rhythm['beats'], float(tempo), sample_rate)
+    cycle_starts = np.arange(0, total_samples, cycle_samples, dtype=np.int64)
+
+    instruments = []
+    for instrument, onsets in compiled:
+        hits = (cycle_starts[:, np.newaxis] + onsets).ravel()
+        hits = hits[hits < total_samples]
+        events = np.zeros(len(hits), dtype=EVENT_DTYPE)
+        events['onset'] = hits
+        events['duration'] = int(INSTRUMENTS[instrument]['seconds'] * sample_rate)
+        events['velocity'] = VOICE_VELOCITIES[instrument]
+        events['voice'] = VOICES.index(instrument)
+        instruments.append(events)
+    return instruments
+
+
+def build_events(manifest, scale, sample_rate):
+    """The whole song of a manifest as one event array sorted by onset"""
+    total_samples = int(manifest['duration'] * sample_rate)
+    events = np.concatenate(
+        note_events(manifest, scale, sample_rate)
+        + stroke_events(manifest['rhythm'], manifest['tempo'], total_samples, sample_rate)
+    )
+    return events[np.argsort(events['onset'], kind='stable')]
+
+
+def split_stems(events):
+    """The events of each stem, in STEMS order and still sorted by onset"""
+    return [
+        events[np.isin(events['voice'], [VOICES.index(voice) for voice in voices])]
+        for voices in STEMS.values()
+    ]
+
+
+def max_duration(events):
+    return int(events['duration'].max()) if len(events) else 0
+
+
+def render_events(events, start, stop, out, source, longest=None):
+    """Add every event sounding in samples [start, stop) into out, which is stop - start long.
+
+    events must be sorted by onset; source(event) returns an event's full waveform at
+    velocity 1. Only events overlapping the block are visited, so the cost of a block
+    grows with the notes sounding in it rather than with the song length.
+    """
+    longest = max_duration(events) if longest is None else longest
+    first = np.searchsorted(events['onset'], start - longest, side='right')
+    last = np.searchsorted(events['onset'], stop, side='left')
+    scratch = np.empty(stop - start, dtype=out.dtype)
+
+    for event in events[first:last]:
+        onset = int(event['onset'])
+        begin = max(start, onset)
+        end = min(stop, onset + int(event['duration']))
+        if end <= begin:
+            continue
+        count = end - begin
+        np.multiply(source(event)[begin - onset:end - onset], event['velocity'], out=scratch[:count])
+        out[begin - start:end - start] += scratch[:count]
+    return out
+
+
+def peak_bound(events, voice_peaks):
+    """Upper bound on the mixed peak: the loudest sum of velocity * source peak sounding at once.
+
+    voice_peaks holds the peak of one source per voice, indexed like VOICES.
+    """
+    if not len(events):
+        return 0.0
+    levels = np.abs(events['velocity'].astype(np.float64)) * np.asarray(voice_peaks)[events['voice']]
+    times = np.concatenate([events['onset'], events['onset'] + events['duration']])
+    changes = np.concatenate([levels, -levels])
+    # Events ending on a sample come off before those starting on it
+    order = np.lexsort((changes, times))
+    return float(np.cumsum(changes[order]).max())
@@ -0,0 +1,119 @@
+from flask_sqlalchemy import SQLAlchemy
+from datetime import datetime
+import json
+
+db = SQLAlchemy()
+
+# Simple Song model
+class Song(db.Model):
+    __tablename__ = 'songs'
+    __table_args__ = (
+        # Keyset pagination walks (upload_date, id) newest first
+        db.Index('ix_songs_upload_date_id', 'upload_date', 'id'),
+        db.Index('ix_songs_maqam_upload_date', 'maqam', 'upload_date'),
+        db.Index('ix_songs_style_upload_date', 'style', 'upload_date'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    title = db.Column(db.String(200), nullable=False)
+    artist = db.Column(db.String(200), nullable=False)
+    lyrics = db.Column(db.Text, nullable=False)
+    maqam = db.Column(db.String(50), nullable=False)
+    style = db.Column(db.String(50), nullable=False)
+    tempo = db.Column(db.Integer, nullable=False)
+    emotion = db.Column(db.String(50), nullable=False)
+    region = db.Column(db.String(50), nullable=False)
+    upload_date = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'title': self.title,
+            'artist': self.artist,
+            'lyrics': self.lyrics,
+            'maqam': self.maqam,
+            'style': self.style,
+            'tempo': self.tempo,
+            'emotion': self.emotion,
+            'region': self.region,
+            'upload_date': self.upload_date.isoformat() if self.upload_date else None
+        }
+
+    @classmethod
+    def summary_columns(cls):
+        """Columns returned by listings that leave out the lyrics"""
+        return [cls.id, cls.title, cls.artist, cls.maqam, cls.style,
+                cls.tempo, cls.emotion, cls.region, cls.upload_date]
+
+# Simple GeneratedSong model
+class GeneratedSong(db.Model):
+    __tablename__ = 'generated_songs'
+    __table_args__ = (
+        # Keyset pagination walks (generation_date, id) newest first
+        db.Index('ix_generated_songs_generation_date_id', 'generation_date', 'id'),
+        db.Index('ix_generated_songs_maqam_generation_date', 'maqam', 'generation_date'),
+        db.Index('ix_generated_songs_style_generation_date', 'style', 'generation_date'),
+        db.Index('ix_generated_songs_emotion_generation_date', 'emotion', 'generation_date'),
+        db.Index('ix_generated_songs_region_generation_date', 'region', 'generation_date'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    title = db.Column(db.String(200), nullable=False)
+    lyrics = db.Column(db.Text, nullable=False)
+    maqam = db.Column(db.String(50), nullable=False)
+    style = db.Column(db.String(50), nullable=False)
+    tempo = db.Column(db.Integer, nullable=False)
+    emotion = db.Column(db.String(50), nullable=False)
+    region = db.Column(db.String(50), nullable=False)
+    generation_date = db.Column(db.DateTime, default=datetime.utcnow)
+    generation_time = db.Column(db.Float)  # Seconds spent rendering (0 for cache hits)
+    render_manifest = db.Column(db.Text)  # JSON manifest that reproduces the render exactly
+    file_info = db.Column(db.Text)  # JSON string with file info
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'title': self.title,
+            'lyrics': self.lyrics,
+            'maqam': self.maqam,
+            'style': self.style,
+            'tempo': self.tempo,
+            'emotion': self.emotion,
+            'region': self.region,
+            'generation_date': self.generation_date.isoformat() if self.generation_date else None,
+            'generation_time': self.generation_time,
+            'render_manifest': json.loads(self.render_manifest) if self.render_manifest else None,
+            'file_info': json.loads(self.file_info) if self.file_info else None
+        }
+
+    @classmethod
+    def summary_columns(cls):
+        """Columns returned by listings that leave out the lyrics"""
+        return [cls.id, cls.title, cls.maqam, cls.style, cls.tempo, cls.emotion,
+                cls.region, cls.generation_date, cls.generation_time, cls.file_info]
+
+# Catalog of audio files written to generated_music
+class AudioFile(db.Model):
+    __tablename__ = 'audio_files'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    song_id = db.Column(db.Integer, db.ForeignKey('generated_songs.id'), index=True)
+    filename = db.Column(db.String(300), nullable=False, unique=True)
+    size_bytes = db.Column(db.Integer, nullable=False)
+    duration_seconds = db.Column(db.Float)
+    format = db.Column(db.String(10), nullable=False)
+    checksum = db.Column(db.String(64))  # SHA-256 hex digest
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'song_id': self.song_id,
+            'filename': self.filename,
+            'file_size_mb': round(self.size_bytes / (1024 * 1024), 2),
+            'duration_seconds': self.duration_seconds,
+            'format': self.format,
+            'checksum': self.checksum,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'download_url': f'/api/generation/download/{self.filename}'
+        }
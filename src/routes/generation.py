@@ -1,23 +1,41 @@
-from flask import Blueprint, request, jsonify, current_app, send_file
+from flask import Blueprint, request, jsonify, current_app, send_file, Response, stream_with_context
+from werkzeug.security import safe_join
 import os
 import json
 import uuid
-from datetime import datetime
 import time
+import threading
 import asyncio
 import sys
-import random
+import zlib
 
-# Add the parent directory to path to import our music generator
+# Add the parent directory to path to import our generation queue
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
-from music_generator import ArabicMusicGenerator
+import metrics
+import startup
+from admission import MAX_LYRICS_BYTES, MAX_TEMPO, MIN_TEMPO, AdmissionRejected
+from audio_formats import AUDIO_FORMATS, song_filename
+from file_catalog import EXTENSION_FORMATS, record_audio_file
+from generation_queue import GenerationQueue, COMPLETE_LATER, JOB_FINISHED
+from render_cache import RenderCache, make_render_key
+from iqaat import IQAAT
 
-from src.models.song import db, GeneratedSong
+from src.models.song import db, GeneratedSong, AudioFile
+from src.routes.listing import paginate_songs
 
 generation_bp = Blueprint('generation', __name__)
 
-# Initialize the music generator
-music_generator = ArabicMusicGenerator()
+# Background generation queue, render cache and record writer, created on first use
+generation_queue = None
+render_cache = None
+generation_recorder = None
+
+# Bounds draft previews rendered inside request threads; a request waits this long for a slot
+preview_slots = threading.BoundedSemaphore(int(os.environ.get('PREVIEW_MAX_RENDERS', os.cpu_count() or 1)))
+PREVIEW_SLOT_TIMEOUT = int(os.environ.get('PREVIEW_SLOT_TIMEOUT_MS', 500)) / 1000
+
+# Listeners following a render that is still encoding hold a request thread each until it finishes
+live_stream_slots = threading.BoundedSemaphore(int(os.environ.get('PLAYBACK_MAX_LIVE_STREAMS', 4)))
 
 def ensure_generated_dirs():
     """Ensure generated files directories exist"""
@@ -25,10 +43,357 @@ def ensure_generated_dirs():
     os.makedirs(generated_path, exist_ok=True)
     return generated_path
 
+def get_generation_queue():
+    """Return the process-wide generation queue"""
+    global generation_queue
+    if generation_queue is None:
+        generation_queue = GenerationQueue(os.path.join(ensure_generated_dirs(), 'jobs'))
+    return generation_queue
+
+def get_audio_mimetype(filename):
+    """Map a generated file's extension to its audio mimetype"""
+    extension = os.path.splitext(filename)[1]
+    for settings in AUDIO_FORMATS.values():
+        if settings['extension'] == extension:
+            return settings['mimetype']
+    return 'audio/mpeg'
+
+def resolve_generated_file(filename):
+    """Path of an audio file directly in generated_music, or None for any other path.
+    
+    Job records and render cache entries live in subdirectories and are never served.
+    """
+    if os.path.splitext(filename)[1] not in EXTENSION_FORMATS:
+        return None
+    generated_dir = os.path.join(current_app.root_path, 'generated_music')
+    file_path = safe_join(generated_dir, filename)
+    if file_path is None or os.path.dirname(file_path) != generated_dir:
+        return None
+    return file_path
+
+def build_song_filename(params):
+    """Output filename the generator writes for params"""
+    return song_filename(params['title'], params['maqam'], params['style'], params['render_id'],
+                         AUDIO_FORMATS[params['audio_format']]['extension'])
+
+def get_render_cache():
+    """Return the process-wide render cache"""
+    global render_cache
+    if render_cache is None:
+        render_cache = RenderCache(os.path.join(ensure_generated_dirs(), 'cache'))
+    return render_cache
+
+def read_lyrics(lyrics_file):
+    """Read an uploaded lyrics file, refusing more than MAX_LYRICS_BYTES; raises ValueError"""
+    data = lyrics_file.read(MAX_LYRICS_BYTES + 1)
+    if len(data) > MAX_LYRICS_BYTES:
+        raise ValueError(f'Lyrics are limited to {MAX_LYRICS_BYTES // 1024} KB')
+    return data.decode('utf-8')
+
+def rejected_response(error):
+    """JSON answer for a request the render budgets turned away"""
+    headers = {'Retry-After': str(error.retry_after)} if error.retry_after else {}
+    return jsonify({'success': False, 'error': str(error), 'retry_after': error.retry_after}), error.status, headers
+
+def build_generation_params(lyrics_content, values):
+    """Validate generation parameters from a form or batch item; raises ValueError"""
+    if len(lyrics_content.encode('utf-8')) > MAX_LYRICS_BYTES:
+        raise ValueError(f'Lyrics are limited to {MAX_LYRICS_BYTES // 1024} KB')
+    
+    # Get generation parameters
+    maqam = values.get('maqam', 'hijaz')
+    style = values.get('style', 'modern')
+    try:
+        tempo = int(values.get('tempo', 120))
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid tempo: {values.get('tempo')}")
+    if not MIN_TEMPO <= tempo <= MAX_TEMPO:
+        raise ValueError(f'Tempo must be between {MIN_TEMPO} and {MAX_TEMPO} BPM')
+    emotion = values.get('emotion', 'neutral')
+    region = values.get('region', 'mixed')
+    seed = values.get('seed')
+    seed = int(seed) if seed not in (None, '') else None
+    iqa = values.get('iqa') or None
+    if iqa is not None and iqa not in IQAAT:
+        raise ValueError(f"Unknown iqa'a: {iqa}")
+    
+    audio_format = values.get('format', 'mp3')
+    if audio_format not in AUDIO_FORMATS:
+        raise ValueError(f'Unsupported format: {audio_format}')
+    bitrate = values.get('bitrate') or AUDIO_FORMATS[audio_format]['default_bitrate']
+    
+    # Generate title from lyrics (first line, or a number derived from the lyrics)
+    title_line = lyrics_content.split('\n')[0].strip() if lyrics_content else ""
+    fallback_number = zlib.crc32(lyrics_content.encode('utf-8')) % 1000 + 1
+    title = values.get('title') or (title_line[:50] if title_line else f"Generated Song {fallback_number}")
+    
+    return {
+        'title': title,
+        'lyrics': lyrics_content,
+        'maqam': maqam,
+        'style': style,
+        'emotion': emotion,
+        'region': region,
+        'tempo': tempo,
+        'seed': seed,
+        'iqa': iqa,
+        'audio_format': audio_format,
+        'bitrate': bitrate,
+        'output_dir': ensure_generated_dirs(),
+        # Names this render's files, so songs sharing a title never overwrite each other
+        'render_id': uuid.uuid4().hex[:12]
+    }
+
+def build_file_info(result):
+    """file_info of a song record: a finished render, or a draft preview awaiting its full render"""
+    file_info = {
+        'status': 'preview' if result.get('preview') else 'generated',
+        'filename': result['filename'],
+        'file_size_mb': result['file_size_mb'],
+        'duration_seconds': result['duration_seconds'],
+        'format': result['format'],
+        'generation_time': result['generation_time']
+    }
+    if result.get('preview'):
+        file_info['sample_rate'] = result['sample_rate']
+    return file_info
+
+def save_generated_songs(app, completed):
+    """Persist finished generations and catalog their files in one transaction.
+    
+    completed is a list of (params, result) pairs; returns one dict of extra job
+    result fields per pair. Runs in the queue's callback thread.
+    """
+    with app.app_context(), metrics.observe_stage('db_commit'):
+        try:
+            generated_songs = []
+            for params, result in completed:
+                generated_songs.append(GeneratedSong(
+                    title=params['title'],
+                    lyrics=params['lyrics'],
+                    maqam=params['maqam'],
+                    style=params['style'],
+                    tempo=params['tempo'],
+                    emotion=params['emotion'],
+                    region=params['region'],
+                    generation_time=result['generation_time'],
+                    render_manifest=json.dumps(result['manifest']) if result.get('manifest') else None,
+                    file_info=json.dumps(build_file_info(result))
+                ))
+            db.session.add_all(generated_songs)
+            db.session.flush()
+            
+            for generated_song, (params, result) in zip(generated_songs, completed):
+                record_audio_file(
+                    result['filename'],
+                    result['file_size_bytes'],
+                    result['format'],
+                    checksum=result['checksum'],
+                    duration_seconds=result['duration_seconds'],
+                    song_id=generated_song.id
+                )
+            db.session.commit()
+            
+            print(f"✅ Saved {len(generated_songs)} song(s) to database")
+            return [{'song_id': generated_song.id} for generated_song in generated_songs]
+            
+        except Exception as db_error:
+            db.session.rollback()
+            print(f"⚠️ Database save failed: {db_error}")
+            # Keep the jobs successful since the MP3s were generated
+            return [{'warning': 'Database save failed but MP3 file was created successfully'}] * len(completed)
+
+def save_generated_song(app, params, result):
+    """Persist a single finished generation"""
+    return save_generated_songs(app, [(params, result)])[0]
+
+class BatchRecorder:
+    """Buffers finished generations and writes their records in bulk transactions.
+    
+    Records are written once commit_size items are buffered, on flush(), or, with a
+    flush_interval, at most that many seconds after the first buffered item. Jobs
+    stay running (stage 'saving') until their record is written, so a completed job
+    always carries its song_id.
+    """
+    
+    def __init__(self, app, queue, commit_size=None, flush_interval=None):
+        self.app = app
+        self.queue = queue
+        self.commit_size = commit_size or int(os.environ.get('BATCH_COMMIT_SIZE', 50))
+        self.flush_interval = flush_interval
+        self._buffer = []
+        self._timer = None
+        self._lock = threading.Lock()
+    
+    def add(self, job, params, result):
+        """Buffer one finished item as a queue on_complete callback; flush completes its job"""
+        self.queue.store.update(job['id'], stage='saving', progress=1.0)
+        with self._lock:
+            self._buffer.append((job['id'], params, result))
+            full = len(self._buffer) >= self.commit_size
+            if not full and self.flush_interval and self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if full:
+            self.flush()
+        return COMPLETE_LATER
+    
+    def flush(self, batch=None):
+        """Write buffered items in one transaction, then mark their jobs completed"""
+        with self._lock:
+            pending, self._buffer = self._buffer, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not pending:
+            return
+        extras = save_generated_songs(self.app, [(params, result) for _, params, result in pending])
+        for (job_id, _, result), extra in zip(pending, extras):
+            result.update(extra)
+            self.queue.complete(job_id, result)
+
+def get_generation_recorder(app, queue):
+    """Return the process-wide recorder that coalesces single-song commits"""
+    global generation_recorder
+    if generation_recorder is None:
+        delay = int(os.environ.get('DB_COMMIT_DELAY_MS', 250)) / 1000
+        # A zero delay commits every song as soon as it finishes
+        generation_recorder = BatchRecorder(app, queue, commit_size=None if delay else 1, flush_interval=delay)
+    return generation_recorder
+
+def serve_cached_render(app, params, on_hit=None):
+    """Answer from the render cache when these parameters were rendered before.
+    
+    A hit is saved as a new song, or handed to on_hit(result) for its extra fields.
+    """
+    cache = get_render_cache()
+    cache_key = make_render_key(params['lyrics'], params['maqam'], params['style'], params['emotion'],
+                                params['region'], params['tempo'], params['seed'],
+                                audio_format=params['audio_format'], bitrate=params['bitrate'],
+                                iqa=params.get('iqa'), manifest=params.get('manifest'))
+    cached = cache.lookup(cache_key)
+    if not cached:
+        return None
+    
+    filename = build_song_filename(params)
+    file_path = cache.materialize(cache_key, os.path.join(params['output_dir'], filename))
+    result = {
+        'success': True,
+        'file_path': file_path,
+        'filename': filename,
+        'file_size_mb': cached['file_size_mb'],
+        'duration_seconds': cached['duration_seconds'],
+        'seed': cached['seed'],
+        'format': params['audio_format'],
+        'file_size_bytes': cached['file_size_bytes'],
+        'checksum': cached['checksum'],
+        'manifest': cached.get('manifest'),
+        'cache_key': cache_key,
+        'cache_hit': True,
+        'generation_time': 0.0
+    }
+    result.update(on_hit(result) if on_hit else save_generated_song(app, params, result))
+    print(f"⚡ Cache hit: {filename}")
+    return result
+
+def save_reencoded_file(app, song_id, result):
+    """Catalog a re-encoded file under the song it was rendered from"""
+    with app.app_context(), metrics.observe_stage('db_commit'):
+        try:
+            record_audio_file(
+                result['filename'],
+                result['file_size_bytes'],
+                result['format'],
+                checksum=result['checksum'],
+                duration_seconds=result['duration_seconds'],
+                song_id=song_id
+            )
+            db.session.commit()
+            return {'song_id': song_id}
+        except Exception as db_error:
+            db.session.rollback()
+            print(f"⚠️ Database save failed: {db_error}")
+            return {'warning': 'Database save failed but the file was created successfully'}
+
+def upgrade_generated_song(app, song_id, result):
+    """Point a draft preview's record at its finished full-quality render"""
+    with app.app_context(), metrics.observe_stage('db_commit'):
+        try:
+            song = db.session.get(GeneratedSong, song_id)
+            if song is None:
+                return {'warning': 'Preview record was deleted; the full render was kept on disk'}
+            preview_info = json.loads(song.file_info) if song.file_info else {}
+            file_info = build_file_info(result)
+            file_info['preview_filename'] = preview_info.get('filename')
+            song.file_info = json.dumps(file_info)
+            song.generation_time = result['generation_time']
+            song.render_manifest = json.dumps(result['manifest']) if result.get('manifest') else song.render_manifest
+            record_audio_file(
+                result['filename'],
+                result['file_size_bytes'],
+                result['format'],
+                checksum=result['checksum'],
+                duration_seconds=result['duration_seconds'],
+                song_id=song_id
+            )
+            db.session.commit()
+            print(f"✅ Upgraded song {song_id} to its full render")
+            return {'song_id': song_id}
+        except Exception as db_error:
+            db.session.rollback()
+            print(f"⚠️ Database save failed: {db_error}")
+            return {'warning': 'Database save failed but the full render was created successfully'}
+
+def render_preview(app, params, cost, seconds=None):
+    """Render a draft preview in this request, save it as a song and queue its full render.
+    
+    cost is the full render's admitted estimate, so a preview is only rendered when
+    its upgrade can be queued. Raises AdmissionRejected when no preview slot frees up
+    within PREVIEW_SLOT_TIMEOUT, rather than holding the request thread.
+    """
+    if not preview_slots.acquire(timeout=PREVIEW_SLOT_TIMEOUT):
+        raise AdmissionRejected('Too many draft previews rendering, try again shortly', retry_after=1)
+    try:
+        with metrics.observe_stage('preview'):
+            start_time = time.perf_counter()
+            preview = asyncio.run(startup.get_generator().generate_preview(seconds=seconds, **params))
+    finally:
+        preview_slots.release()
+    if not preview['success']:
+        return preview
+    preview.pop('stages', None)
+    preview['generation_time'] = round(time.perf_counter() - start_time, 2)
+    preview.update(save_generated_song(app, params, preview))
+    
+    song_id = preview.get('song_id')
+    params = dict(params, cache_dir=get_render_cache().cache_dir)
+    queue = get_generation_queue()
+    job = queue.submit(
+        params,
+        on_complete=lambda job, result: upgrade_generated_song(app, song_id, result) if song_id else {},
+        info=dict(job_info(params), song_id=song_id),
+        cost=cost
+    )
+    preview.update({
+        'play_url': f"/api/generation/play/{preview['filename']}",
+        'job_id': job['id'],
+        'status_url': f"/api/generation/jobs/{job['id']}",
+        'cancel_url': f"/api/generation/jobs/{job['id']}/cancel"
+    })
+    return preview
+
+def job_info(params):
+    filename = build_song_filename(params)
+    return {'filename': filename, 'play_url': f'/api/generation/play/{filename}'}
+
 @generation_bp.route('/generation/generate', methods=['POST'])
 def generate_music():
-    """Generate actual MP3 music from lyrics and parameters"""
+    """Queue MP3 generation from lyrics and parameters and return a job id"""
     try:
+        if not startup.renders_here():
+            return jsonify({'success': False, 'error': 'Generation is served by render workers'}), 503
+        
         print("=== MUSIC GENERATION REQUEST ===")
         
         # Handle file upload (lyrics file)
@@ -37,162 +402,338 @@ def generate_music():
             return jsonify({'success': False, 'error': 'No lyrics file provided'}), 400
         
         try:
-            lyrics_content = lyrics_file.read().decode('utf-8')
+            lyrics_content = read_lyrics(lyrics_file)
             print(f"✅ Lyrics read successfully, length: {len(lyrics_content)}")
         except Exception as e:
             return jsonify({'success': False, 'error': f'Error reading lyrics file: {str(e)}'}), 400
         
-        # Get generation parameters
-        maqam = request.form.get('maqam', 'hijaz')
-        style = request.form.get('style', 'modern')
-        tempo = int(request.form.get('tempo', 120))
-        emotion = request.form.get('emotion', 'neutral')
-        region = request.form.get('region', 'mixed')
-        
-        # Generate title from lyrics (first line or random)
-        title_line = lyrics_content.split('\n')[0].strip() if lyrics_content else ""
-        title = title_line[:50] if title_line else f"Generated Song {random.randint(1, 1000)}"
+        try:
+            params = build_generation_params(lyrics_content, request.form)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         
-        print(f"🎵 Generating: {title} - {maqam} {style} {emotion} {tempo}BPM")
+        print(f"🎵 Queueing: {params['title']} - {params['maqam']} {params['style']} {params['emotion']} {params['tempo']}BPM")
         
-        # Ensure output directory exists
-        output_dir = ensure_generated_dirs()
+        app = current_app._get_current_object()
         
-        # Record generation start time
-        generation_start = time.time()
+        # Identical parameters were rendered before: serve the cached MP3 right away
+        cached_result = serve_cached_render(app, params)
+        if cached_result:
+            return jsonify({
+                'success': True,
+                'message': f'Song "{params["title"]}" generated successfully!',
+                'cached': True,
+                **cached_result
+            })
         
+        # Estimate the render and turn it away now if the queue cannot take it
+        queue = get_generation_queue()
         try:
-            # Generate the actual MP3 file
-            result = asyncio.run(music_generator.generate_song(
-                title=title,
-                lyrics=lyrics_content,
-                maqam=maqam,
-                style=style,
-                emotion=emotion,
-                region=region,
-                tempo=tempo,
-                output_dir=output_dir
-            ))
-            
-            if not result['success']:
-                return jsonify({
-                    'success': False,
-                    'error': f"Music generation failed: {result.get('error', 'Unknown error')}"
-                }), 500
-            
-            generation_time = time.time() - generation_start
-            
-            print(f"✅ Generated MP3: {result['filename']} ({result['file_size_mb']} MB)")
-            
-            # Create database record with ONLY the required fields
+            cost = queue.admit(params)
+        except AdmissionRejected as e:
+            print(f"⏳ Rejected ({e.status}): {e}")
+            return rejected_response(e)
+        
+        # Draft preview: answer with the first seconds now, render the full song in the background
+        if request.form.get('preview') in ('1', 'true', 'on'):
+            seconds = request.form.get('preview_seconds')
             try:
-                generated_song = GeneratedSong(
-                    input_lyrics=lyrics_content,  # Use the original field name
-                    maqam=maqam,
-                    style=style,
-                    tempo=tempo,
-                    emotion=emotion,
-                    generation_time=generation_time
-                )
-                
-                db.session.add(generated_song)
-                db.session.commit()
-                
-                print(f"✅ Saved to database with ID: {generated_song.id}")
-                
-                return jsonify({
-                    'success': True,
-                    'message': f'Song "{title}" generated successfully!',
-                    'song_id': generated_song.id,
-                    'filename': result['filename'],
-                    'file_path': result['file_path'],
-                    'file_size_mb': result['file_size_mb'],
-                    'generation_time': f'{generation_time:.1f} seconds',
-                    'duration_seconds': result.get('duration_seconds', 0)
-                })
-                
-            except Exception as db_error:
-                print(f"⚠️ Database save failed: {db_error}")
-                # Return success anyway since MP3 was generated
-                return jsonify({
-                    'success': True,
-                    'message': f'Song "{title}" generated successfully! (Database save failed but MP3 created)',
-                    'filename': result['filename'],
-                    'file_path': result['file_path'],
-                    'file_size_mb': result['file_size_mb'],
-                    'generation_time': f'{generation_time:.1f} seconds',
-                    'duration_seconds': result.get('duration_seconds', 0),
-                    'warning': 'Database save failed but MP3 file was created successfully'
-                })
+                seconds = min(max(float(seconds), 0.0), 300.0) if seconds not in (None, '') else None
+            except ValueError:
+                return jsonify({'success': False, 'error': 'preview_seconds must be a number'}), 400
             
-        except Exception as gen_error:
-            print(f"❌ Generation error: {gen_error}")
+            try:
+                preview = render_preview(app, params, cost, seconds)
+            except AdmissionRejected as e:
+                print(f"⏳ Rejected ({e.status}): {e}")
+                return rejected_response(e)
+            if not preview['success']:
+                return jsonify({'success': False, 'error': preview['error']}), 500
             return jsonify({
-                'success': False,
-                'error': f'Music generation failed: {str(gen_error)}'
-            }), 500
+                'message': f'Preview of "{params["title"]}" ready; full render queued',
+                **preview
+            }), 202
+        
+        params['cache_dir'] = get_render_cache().cache_dir
+        if metrics.profiling_enabled() and (request.args.get('profile') == '1' or request.headers.get('X-Profile') == '1'):
+            # Profile the render itself too; the worker writes the dump and reports its path
+            params['profile'] = True
+        # Records of songs finishing close together are committed in one transaction
+        recorder = get_generation_recorder(app, queue)
+        job = queue.submit(
+            params,
+            on_complete=lambda job, result: recorder.add(job, params, result),
+            info=job_info(params),
+            cost=cost
+        )
+        
+        return jsonify({
+            'success': True,
+            'message': f'Song "{params["title"]}" queued for generation',
+            'job_id': job['id'],
+            'status': job['status'],
+            'status_url': f"/api/generation/jobs/{job['id']}",
+            'play_url': job['play_url'],
+            'estimated_cost': job['estimated_cost'],
+            'queue': queue.stats()
+        }), 202
         
     except Exception as e:
         print(f"❌ Request error: {e}")
         return jsonify({'success': False, 'error': f'Request failed: {str(e)}'}), 500
 
-@generation_bp.route('/generation/list', methods=['GET'])
-def list_generated_songs():
-    """Get all generated songs"""
+@generation_bp.route('/generation/batch', methods=['POST'])
+def generate_batch():
+    """Queue many lyrics documents at once, with shared and per-item parameters.
+    
+    Accepts multipart lyrics_files plus shared form fields, and/or an "items" field
+    holding a JSON list of per-item overrides (each may carry its own "lyrics").
+    """
     try:
-        print("=== LIST GENERATED SONGS REQUEST ===")
-        songs = GeneratedSong.query.order_by(GeneratedSong.generation_date.desc()).all()
-        print(f"Found {len(songs)} generated songs in database")
-        
-        # Also check for MP3 files in the directory
-        generated_dir = os.path.join(current_app.root_path, 'generated_music')
-        mp3_files = []
-        if os.path.exists(generated_dir):
-            mp3_files = [f for f in os.listdir(generated_dir) if f.endswith('.mp3')]
-        
-        songs_data = []
-        for song in songs:
-            song_dict = song.to_dict()
-            songs_data.append(song_dict)
-        
-        # Add standalone MP3 files that aren't in database
-        for mp3_file in mp3_files:
-            file_path = os.path.join(generated_dir, mp3_file)
-            file_size = os.path.getsize(file_path) / (1024 * 1024)  # MB
+        if not startup.renders_here():
+            return jsonify({'success': False, 'error': 'Generation is served by render workers'}), 503
+        
+        lyrics_files = request.files.getlist('lyrics_files')
+        try:
+            overrides = json.loads(request.form.get('items') or '[]')
+        except ValueError:
+            return jsonify({'success': False, 'error': 'items must be a JSON list'}), 400
+        if not isinstance(overrides, list):
+            return jsonify({'success': False, 'error': 'items must be a JSON list'}), 400
+        
+        count = max(len(lyrics_files), len(overrides))
+        if count == 0:
+            return jsonify({'success': False, 'error': 'No lyrics provided'}), 400
+        if count > int(os.environ.get('BATCH_MAX_ITEMS', 1000)):
+            return jsonify({'success': False, 'error': 'Too many items in one batch'}), 400
+        
+        print(f"=== BATCH GENERATION REQUEST ({count} items) ===")
+        
+        shared = request.form.to_dict()
+        shared.pop('items', None)
+        
+        app = current_app._get_current_object()
+        results = []
+        queued_items = []
+        for index in range(count):
+            item = dict(shared, **(overrides[index] if index < len(overrides) else {}))
+            try:
+                if index < len(lyrics_files):
+                    lyrics_content = read_lyrics(lyrics_files[index])
+                else:
+                    lyrics_content = item.get('lyrics') or ''
+                if not lyrics_content.strip():
+                    raise ValueError('No lyrics provided')
+                params = build_generation_params(lyrics_content, item)
+            except (ValueError, UnicodeDecodeError) as e:
+                results.append({'index': index, 'success': False, 'error': str(e)})
+                continue
+            
+            cached_result = serve_cached_render(app, params)
+            if cached_result:
+                results.append({'index': index, 'success': True, 'cached': True, **cached_result})
+                continue
             
-            songs_data.append({
-                'id': f'file_{mp3_file}',
-                'title': mp3_file.replace('.mp3', ''),
-                'lyrics': 'Generated song (database record not found)',
-                'maqam': 'unknown',
-                'style': 'unknown',
-                'tempo': 120,
-                'emotion': 'unknown',
-                'region': 'unknown',
-                'file_path': file_path,
-                'filename': mp3_file,
-                'file_size_mb': round(file_size, 2),
-                'generation_time': 0,
-                'created_at': datetime.now().isoformat(),
-                'has_audio_file': True
+            # Batches are queued whole behind interactive requests rather than
+            # turned away, but an item too big to ever render is refused
+            try:
+                get_generation_queue().admit(params, check_queue=False)
+            except AdmissionRejected as e:
+                results.append({'index': index, 'success': False, 'error': str(e)})
+                continue
+            
+            params['cache_dir'] = get_render_cache().cache_dir
+            queued_items.append((index, params))
+        
+        batch = None
+        if queued_items:
+            queue = get_generation_queue()
+            recorder = BatchRecorder(app, queue)
+            queued_params = dict(queued_items)
+            batch = queue.submit_batch(
+                [(params, dict(job_info(params), batch_index=index)) for index, params in queued_items],
+                on_complete=lambda job, result: recorder.add(job, queued_params[job['batch_index']], result),
+                on_batch_complete=recorder.flush
+            )
+            for (index, params), job_id in zip(queued_items, batch['job_ids']):
+                results.append({'index': index, 'success': True, 'job_id': job_id, 'title': params['title']})
+        
+        results.sort(key=lambda item: item['index'])
+        return jsonify({
+            'success': True,
+            'batch_id': batch['id'] if batch else None,
+            'status_url': f"/api/generation/batch/{batch['id']}" if batch else None,
+            'total': count,
+            'queued': len(queued_items),
+            'items': results
+        }), 202
+        
+    except Exception as e:
+        print(f"❌ Batch request error: {e}")
+        return jsonify({'success': False, 'error': f'Request failed: {str(e)}'}), 500
+
+@generation_bp.route('/generation/<int:song_id>/encode', methods=['POST'])
+def reencode_generated_song(song_id):
+    """Reproduce a song from its render manifest and encode it in another format"""
+    try:
+        if not startup.renders_here():
+            return jsonify({'success': False, 'error': 'Generation is served by render workers'}), 503
+        
+        song = db.session.get(GeneratedSong, song_id)
+        if song is None:
+            return jsonify({'success': False, 'error': 'Song not found'}), 404
+        if not song.render_manifest:
+            return jsonify({'success': False, 'error': 'Song has no render manifest to reproduce'}), 409
+        
+        values = request.get_json(silent=True) or request.form
+        try:
+            params = build_generation_params(song.lyrics, {
+                'title': song.title,
+                'maqam': song.maqam,
+                'style': song.style,
+                'emotion': song.emotion,
+                'region': song.region,
+                'tempo': song.tempo,
+                'format': values.get('format', 'mp3'),
+                'bitrate': values.get('bitrate')
             })
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        params['manifest'] = json.loads(song.render_manifest)
+        params['seed'] = params['manifest']['seed']
+        
+        app = current_app._get_current_object()
+        cached_result = serve_cached_render(app, params, on_hit=lambda result: save_reencoded_file(app, song_id, result))
+        if cached_result:
+            return jsonify({'success': True, 'cached': True, **cached_result})
+        
+        queue = get_generation_queue()
+        try:
+            cost = queue.admit(params)
+        except AdmissionRejected as e:
+            return rejected_response(e)
+        
+        params['cache_dir'] = get_render_cache().cache_dir
+        job = queue.submit(
+            params,
+            on_complete=lambda job, result: save_reencoded_file(app, song_id, result),
+            info=job_info(params),
+            cost=cost
+        )
         
         return jsonify({
             'success': True,
-            'songs': songs_data
-        })
+            'message': f'Song "{params["title"]}" queued for {params["audio_format"]} encoding',
+            'job_id': job['id'],
+            'status': job['status'],
+            'status_url': f"/api/generation/jobs/{job['id']}",
+            'play_url': job['play_url']
+        }), 202
+        
+    except Exception as e:
+        print(f"❌ Re-encode error: {e}")
+        return jsonify({'success': False, 'error': f'Request failed: {str(e)}'}), 500
+
+@generation_bp.route('/generation/batch/<batch_id>', methods=['GET'])
+def get_generation_batch(batch_id):
+    """Report per-item state and results of a batch"""
+    try:
+        batch = get_generation_queue().get_batch(batch_id)
+        if not batch:
+            return jsonify({'success': False, 'error': 'Batch not found'}), 404
+        
+        return jsonify({'success': True, 'batch': batch})
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@generation_bp.route('/generation/jobs/<job_id>', methods=['GET'])
+def get_generation_job(job_id):
+    """Report state, progress and result of a generation job"""
+    try:
+        job = get_generation_queue().get(job_id)
+        if not job:
+            return jsonify({'success': False, 'error': 'Job not found'}), 404
+        
+        return jsonify({'success': True, 'job': job})
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@generation_bp.route('/generation/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_generation_job(job_id):
+    """Cancel a queued or running job, e.g. the full render of a discarded preview"""
+    try:
+        queue = get_generation_queue()
+        job = queue.get(job_id)
+        if not job:
+            return jsonify({'success': False, 'error': 'Job not found'}), 404
+        if job['status'] in JOB_FINISHED:
+            return jsonify({'success': False, 'error': f"Job already {job['status']}"}), 409
+        
+        return jsonify({'success': True, 'job': queue.cancel(job_id)})
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@generation_bp.route('/generation/cache', methods=['GET'])
+def get_render_cache_stats():
+    """Report render cache hit/miss counters and size"""
+    try:
+        return jsonify({'success': True, 'cache': get_render_cache().stats()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@generation_bp.route('/generation/queue', methods=['GET'])
+def get_generation_queue_stats():
+    """Report queue depth and worker usage"""
+    try:
+        return jsonify({'success': True, 'queue': get_generation_queue().stats()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@generation_bp.route('/generation/list', methods=['GET'])
+def list_generated_songs():
+    """List generated songs, newest first, one keyset page at a time"""
+    try:
+        page = paginate_songs(GeneratedSong, GeneratedSong.generation_date,
+                              GeneratedSong.summary_columns(), request.args)
+        
+        # Cataloged files without a song record are only added on request
+        if request.args.get('include_files') == 'true' and not request.args.get('cursor'):
+            for audio_file in AudioFile.query.filter(AudioFile.song_id.is_(None)).all():
+                page['songs'].append({
+                    'id': f'file_{audio_file.filename}',
+                    'title': os.path.splitext(audio_file.filename)[0],
+                    'lyrics_preview': 'Generated song (database record not found)',
+                    'maqam': 'unknown',
+                    'style': 'unknown',
+                    'tempo': 120,
+                    'emotion': 'unknown',
+                    'region': 'unknown',
+                    'filename': audio_file.filename,
+                    'file_size_mb': audio_file.to_dict()['file_size_mb'],
+                    'generation_time': 0,
+                    'created_at': audio_file.created_at.isoformat() if audio_file.created_at else None,
+                    'has_audio_file': True
+                })
+        
+        return jsonify({'success': True, **page})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         print(f"❌ List songs error: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @generation_bp.route('/generation/download/<path:filename>', methods=['GET'])
 def download_generated_song_by_filename(filename):
-    """Download MP3 file by filename"""
+    """Download a generated audio file by filename"""
     try:
         print(f"=== DOWNLOAD REQUEST for file {filename} ===")
         
-        generated_dir = os.path.join(current_app.root_path, 'generated_music')
-        file_path = os.path.join(generated_dir, filename)
+        file_path = resolve_generated_file(filename)
+        if file_path is None:
+            return jsonify({'success': False, 'error': 'Invalid filename'}), 400
         
         if not os.path.exists(file_path):
             print(f"❌ File not found: {file_path}")
@@ -204,37 +745,96 @@ def download_generated_song_by_filename(filename):
             file_path,
             as_attachment=True,
             download_name=filename,
-            mimetype='audio/mpeg'
+            mimetype=get_audio_mimetype(filename)
         )
         
     except Exception as e:
         print(f"❌ Download error: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def stream_growing_file(part_path, chunk_size=64 * 1024, poll_interval=0.25):
+    """Yield a file the encoder is still writing, following it until it is renamed into place"""
+    with open(part_path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if chunk:
+                yield chunk
+            elif os.path.exists(part_path):
+                time.sleep(poll_interval)
+            else:
+                # Encoder finished (or gave up); the open handle still sees the whole file
+                remaining = f.read()
+                if remaining:
+                    yield remaining
+                return
+
+@generation_bp.route('/generation/play/<path:filename>', methods=['GET'])
+def play_generated_song(filename):
+    """Serve a generated audio file for inline playback with byte-range and cache validation"""
+    try:
+        file_path = resolve_generated_file(filename)
+        if file_path is None:
+            return jsonify({'success': False, 'error': 'Invalid filename'}), 400
+        
+        if os.path.exists(file_path):
+            # conditional=True gives 206 range responses plus ETag/Last-Modified checks
+            return send_file(
+                file_path,
+                mimetype=get_audio_mimetype(filename),
+                as_attachment=False,
+                download_name=os.path.basename(filename),
+                conditional=True,
+                etag=True,
+                max_age=int(os.environ.get('PLAYBACK_MAX_AGE', 86400))
+            )
+        
+        # Still encoding: stream what has been written so far and follow the encoder.
+        # That holds a thread for the rest of the encode, so it is only done on threaded
+        # servers (gthread, ASGI) with a slot free; a sync worker would be blocked outright
+        part_path = f"{file_path}.part"
+        if os.path.exists(part_path):
+            if not request.environ.get('wsgi.multithread') or not live_stream_slots.acquire(blocking=False):
+                return jsonify({
+                    'success': False,
+                    'status': 'encoding',
+                    'error': 'Song is still encoding, retry shortly'
+                }), 202, {'Retry-After': '2', 'Cache-Control': 'no-store'}
+            response = Response(
+                stream_with_context(stream_growing_file(part_path)),
+                mimetype=get_audio_mimetype(filename),
+                headers={
+                    'Cache-Control': 'no-store',
+                    'Content-Disposition': 'inline'
+                }
+            )
+            response.call_on_close(live_stream_slots.release)
+            return response
+        
+        return jsonify({'success': False, 'error': 'File not found'}), 404
+        
+    except Exception as e:
+        print(f"❌ Playback error: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @generation_bp.route('/generation/<int:song_id>/download', methods=['GET'])
 def download_generated_song(song_id):
-    """Download MP3 file by song ID"""
+    """Download the audio file cataloged for a song ID"""
     try:
         print(f"=== DOWNLOAD REQUEST for song {song_id} ===")
-        song = GeneratedSong.query.get_or_404(song_id)
-        
-        # Try to find the MP3 file
-        generated_dir = os.path.join(current_app.root_path, 'generated_music')
-        
-        # Look for files that might match this song
-        if os.path.exists(generated_dir):
-            mp3_files = [f for f in os.listdir(generated_dir) if f.endswith('.mp3')]
-            if mp3_files:
-                # Return the first MP3 file found
-                file_path = os.path.join(generated_dir, mp3_files[0])
-                return send_file(
-                    file_path,
-                    as_attachment=True,
-                    download_name=mp3_files[0],
-                    mimetype='audio/mpeg'
-                )
+        audio_file = AudioFile.query.filter_by(song_id=song_id).order_by(AudioFile.created_at.desc()).first()
+        if audio_file is None:
+            return jsonify({'success': False, 'error': 'No audio file found for this song'}), 404
         
-        return jsonify({'success': False, 'error': 'No MP3 file found'}), 404
+        file_path = os.path.join(current_app.root_path, 'generated_music', audio_file.filename)
+        if not os.path.exists(file_path):
+            return jsonify({'success': False, 'error': 'Audio file is missing on disk'}), 404
+        
+        return send_file(
+            file_path,
+            as_attachment=True,
+            download_name=audio_file.filename,
+            mimetype=get_audio_mimetype(audio_file.filename)
+        )
         
     except Exception as e:
         print(f"❌ Download error: {e}")
@@ -242,31 +842,19 @@ def download_generated_song(song_id):
 
 @generation_bp.route('/generation/files', methods=['GET'])
 def list_mp3_files():
-    """List all MP3 files in the generated_music directory"""
+    """List cataloged audio files in the generated_music directory"""
     try:
-        generated_dir = os.path.join(current_app.root_path, 'generated_music')
-        
-        if not os.path.exists(generated_dir):
-            return jsonify({'success': True, 'files': []})
-        
-        mp3_files = []
-        for filename in os.listdir(generated_dir):
-            if filename.endswith('.mp3'):
-                file_path = os.path.join(generated_dir, filename)
-                file_size = os.path.getsize(file_path) / (1024 * 1024)  # MB
-                
-                mp3_files.append({
-                    'filename': filename,
-                    'file_size_mb': round(file_size, 2),
-                    'download_url': f'/api/generation/download/{filename}'
-                })
+        query = AudioFile.query
+        if request.args.get('format'):
+            query = query.filter_by(format=request.args['format'])
+        
+        audio_files = [audio_file.to_dict() for audio_file in query.order_by(AudioFile.id.desc()).all()]
         
         return jsonify({
             'success': True,
-            'files': mp3_files,
-            'total_files': len(mp3_files)
+            'files': audio_files,
+            'total_files': len(audio_files)
         })
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
-
@@ -0,0 +1,106 @@
+"""
+Keyset pagination, filtering and light projections shared by the song listing endpoints
+"""
+
+import json
+import base64
+from datetime import datetime
+from sqlalchemy import and_, or_, func
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+FILTER_FIELDS = ('maqam', 'style', 'emotion', 'region')
+LYRICS_PREVIEW_CHARS = 100
+
+
+def encode_cursor(date, row_id):
+    """Opaque cursor pointing just after (date, row_id)"""
+    raw = f"{date.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        date, row_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(date), int(row_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def parse_date(value, name):
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'Invalid {name} date: {value}')
+
+
+def serialize_row(row):
+    """Turn a projected row into a JSON-friendly dict"""
+    item = row._asdict()
+    for key, value in item.items():
+        if isinstance(value, datetime):
+            item[key] = value.isoformat()
+    if item.get('file_info'):
+        item['file_info'] = json.loads(item['file_info'])
+    return item
+
+
+def paginate_songs(model, date_column, summary_columns, args):
+    """Return one page of model rows, newest first, filtered by the request args.
+
+    Supported args: limit, cursor, maqam, style, emotion, region, since, until and
+    fields ('summary' leaves out the lyrics, 'full' returns to_dict()).
+    Raises ValueError for malformed arguments.
+    """
+    limit = min(max(args.get('limit', DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    fields = args.get('fields', 'summary')
+    if fields not in ('summary', 'full'):
+        raise ValueError(f'Invalid fields: {fields}')
+
+    query = model.query
+    for field in FILTER_FIELDS:
+        value = args.get(field)
+        if value:
+            query = query.filter(getattr(model, field) == value)
+
+    if args.get('since'):
+        query = query.filter(date_column >= parse_date(args['since'], 'since'))
+    if args.get('until'):
+        query = query.filter(date_column < parse_date(args['until'], 'until'))
+
+    # Keyset: continue strictly after the last row of the previous page
+    if args.get('cursor'):
+        cursor_date, cursor_id = decode_cursor(args['cursor'])
+        query = query.filter(or_(
+            date_column < cursor_date,
+            and_(date_column == cursor_date, model.id < cursor_id)
+        ))
+
+    query = query.order_by(date_column.desc(), model.id.desc())
+
+    if fields == 'summary':
+        query = query.with_entities(
+            *summary_columns,
+            func.substr(model.lyrics, 1, LYRICS_PREVIEW_CHARS).label('lyrics_preview')
+        )
+
+    rows = query.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, date_column.key), last.id)
+
+    if fields == 'summary':
+        items = [serialize_row(row) for row in rows]
+    else:
+        items = [row.to_dict() for row in rows]
+
+    return {
+        'songs': items,
+        'next_cursor': next_cursor,
+        'limit': limit
+    }
@@ -10,7 +10,8 @@ function loadGeneratedSongs() {
             if (!container) return;
             
             if (data.success && data.songs && data.songs.length > 0) {
-                container.innerHTML = data.songs.map(song => `
+                // Generated file details live in file_info
+                container.innerHTML = data.songs.map(song => Object.assign({}, song.file_info, song)).map(song => `
                     <div class="song-card">
                         <div class="song-info">
                             <h3>${song.title || 'Generated Song'}</h3>
@@ -22,7 +23,7 @@ function loadGeneratedSongs() {
                             <p><strong>Created:</strong> ${new Date(song.created_at || song.generation_date).toLocaleDateString()}</p>
                             <div class="lyrics-preview">
                                 <strong>Lyrics Preview:</strong>
-                                <div class="lyrics-text">${(song.lyrics || song.input_lyrics || '').substring(0, 100)}...</div>
+                                <div class="lyrics-text">${(song.lyrics_preview || song.lyrics || song.input_lyrics || '').substring(0, 100)}...</div>
                             </div>
                         </div>
                         <div class="song-actions">
@@ -76,14 +77,19 @@ function playMP3(filename) {
     console.log('Playing MP3:', filename);
     
     // Create audio element
-    const audio = new Audio(`/api/generation/download/${encodeURIComponent(filename)}`);
+    const audio = new Audio(`/api/generation/play/${encodeURIComponent(filename)}`);
     
     // Play the audio
     audio.play().then(() => {
         showToast('Playing MP3...', 'info');
     }).catch(error => {
         console.error('Error playing audio:', error);
-        showToast('Error playing MP3', 'error');
+        // 202 means the song is still encoding and the server cannot stream it right now
+        fetch(audio.src, { method: 'HEAD' })
+            .then(response => response.status === 202
+                ? showToast('MP3 is still encoding, try again in a moment', 'info')
+                : showToast('Error playing MP3', 'error'))
+            .catch(() => showToast('Error playing MP3', 'error'));
     });
 }
 
@@ -132,10 +138,13 @@ function handleGeneration() {
     })
     .then(response => response.json())
     .then(data => {
-        if (data.success) {
+        if (data.success && data.cached) {
             showToast(`MP3 generated successfully! File: ${data.filename}`, 'success');
             loadGeneratedSongs(); // Refresh the list
             loadDashboardData(); // Update dashboard stats
+        } else if (data.success) {
+            showToast('Song queued for generation...', 'info');
+            return pollGenerationJob(data.job_id, generateBtn);
         } else {
             showToast('Generation failed: ' + data.error, 'error');
         }
@@ -149,6 +158,40 @@ function handleGeneration() {
     });
 }
 
+// Poll a queued generation job until it completes, fails or is cancelled
+function pollGenerationJob(jobId, generateBtn) {
+    return new Promise((resolve, reject) => {
+        const check = () => {
+            fetch(`/api/generation/jobs/${jobId}`)
+                .then(response => response.json())
+                .then(data => {
+                    if (!data.success) {
+                        throw new Error(data.error);
+                    }
+                    const job = data.job;
+                    if (job.status === 'completed') {
+                        showToast(`MP3 generated successfully! File: ${job.result.filename}`, 'success');
+                        loadGeneratedSongs(); // Refresh the list
+                        loadDashboardData(); // Update dashboard stats
+                        resolve(job);
+                    } else if (job.status === 'failed') {
+                        showToast('Generation failed: ' + job.error, 'error');
+                        resolve(job);
+                    } else if (job.status === 'cancelled') {
+                        showToast('Generation cancelled', 'info');
+                        loadGeneratedSongs(); // A cancelled full render leaves its draft in the list
+                        resolve(job);
+                    } else {
+                        generateBtn.textContent = `Generating MP3... ${Math.round(job.progress * 100)}%`;
+                        setTimeout(check, 2000);
+                    }
+                })
+                .catch(reject);
+        };
+        check();
+    });
+}
+
 // Add CSS for toast notifications (add this to your CSS file)
 const toastCSS = `
 .toast-container {
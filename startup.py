@@ -0,0 +1,105 @@
+"""
+Startup
+Server roles (API-only or render) and a per-phase report of how long a process took to boot
+"""
+
+import os
+import sys
+import time
+import threading
+
+import metrics
+
+ROLE_ALL = 'all'        # Serve every route and render in this process (the default)
+ROLE_API = 'api'        # Listing, playback and download only; never loads the DSP stack
+ROLE_RENDER = 'render'  # Preload and pre-warm the DSP stack at boot
+ROLES = (ROLE_ALL, ROLE_API, ROLE_RENDER)
+
+# Modules whose presence in sys.modules means the render stack was loaded
+DSP_MODULES = ('numpy', 'music_generator', 'audio_effects')
+
+
+def server_role():
+    role = os.environ.get('SERVER_ROLE', ROLE_ALL)
+    if role not in ROLES:
+        raise ValueError(f"SERVER_ROLE must be one of {', '.join(ROLES)}, got {role!r}")
+    return role
+
+
+def renders_here():
+    return server_role() != ROLE_API
+
+
+def migrate_on_start():
+    """Whether server hooks should apply pending migrations (AUTO_MIGRATE, default on)"""
+    return os.environ.get('AUTO_MIGRATE', '1') == '1'
+
+
+class StartupReport:
+    """Wall time of each boot phase, measured between checkpoints"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Start timing again, e.g. in a worker forked from a long-running master"""
+        with self._lock:
+            self.started = time.perf_counter()
+            self.phases = {}
+            self._last = self.started
+
+    def checkpoint(self, name):
+        """Attribute the time since the previous checkpoint to phase name"""
+        with self._lock:
+            now = time.perf_counter()
+            self.phases[name] = self.phases.get(name, 0.0) + now - self._last
+            self._last = now
+
+    def summary(self):
+        with self._lock:
+            return {
+                'role': server_role(),
+                'phases': {name: round(seconds, 3) for name, seconds in self.phases.items()},
+                'total_seconds': round(self._last - self.started, 3),
+                'dsp_loaded': any(name in sys.modules for name in DSP_MODULES)
+            }
+
+    def print_report(self):
+        summary = self.summary()
+        phases = ', '.join(f"{name} {seconds:.2f}s" for name, seconds in summary['phases'].items())
+        dsp = 'DSP stack loaded' if summary['dsp_loaded'] else 'DSP stack not loaded'
+        print(f"⏱️ Startup ({summary['role']}, pid {os.getpid()}): {phases} - total {summary['total_seconds']:.2f}s, {dsp}")
+
+
+# Timed from the first import of this module, so import it before anything heavy
+report = StartupReport()
+metrics.registry.register(metrics.Gauge(
+    'app_startup_seconds', 'Wall time of each startup phase of this process',
+    lambda: {(name,): seconds for name, seconds in report.summary()['phases'].items()},
+    ('phase',)
+))
+
+# Generator shared by in-process renders, built by preload_render_stack or on first use
+_generator = None
+_generator_lock = threading.Lock()
+
+
+def get_generator():
+    """Return this process's generator, importing the DSP stack on first use"""
+    global _generator
+    with _generator_lock:
+        if _generator is None:
+            from music_generator import ArabicMusicGenerator
+
+            _generator = ArabicMusicGenerator()
+        return _generator
+
+
+def preload_render_stack():
+    """Import the DSP modules and pre-render the note bank before the first request"""
+    generator = get_generator()
+    report.checkpoint('dsp_import')
+    generator.prewarm_note_bank()
+    report.checkpoint('note_bank_prewarm')
+    return generator
@@ -0,0 +1,109 @@
+"""
+Stem Store
+Per-voice stems of rendered songs as .npy files, memory-mapped on reuse
+"""
+
+import os
+import hashlib
+import threading
+
+import numpy as np
+
+from render_cache import RENDER_VERSION
+
+
+def stem_key(name, events, total_samples, sample_rate, dtype):
+    """Hash a stem's events and render settings; equal keys mean identical audio"""
+    digest = hashlib.sha256(f"{RENDER_VERSION}:{name}:{total_samples}:{sample_rate}:{np.dtype(dtype).str}:".encode())
+    digest.update(np.ascontiguousarray(events).tobytes())
+    return digest.hexdigest()
+
+
+class StemStore:
+    """Size-bounded LRU of rendered stems under a directory.
+
+    Each stem is one full-length voice (or the percussion) of a song, saved as a
+    .npy file and opened read-only with mmap_mode='r', so a reused stem costs page
+    cache rather than process memory. A song that changes only its mood or effects
+    finds every stem; one that changes its rhythm renders only the rhythm stem.
+    """
+
+    def __init__(self, stem_dir, max_bytes=None):
+        self.stem_dir = stem_dir
+        if max_bytes is None:
+            # Off by default: writing full-length stems costs more than a sequenced mix
+            max_bytes = int(os.environ.get('STEM_STORE_MAX_MB', 0)) * 1024 * 1024
+        self.max_bytes = max_bytes  # 0 disables the store
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(stem_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.stem_dir, f"{key}.npy")
+
+    def get(self, key, render):
+        """Return the stem for key memory-mapped, calling render() to build it on a miss"""
+        path = self._path(key)
+        try:
+            stem = np.load(path, mmap_mode='r')
+            # Touch the entry so eviction treats it as recently used
+            os.utime(path)
+            with self._lock:
+                self.hits += 1
+            return stem
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            np.save(f, render())
+        os.replace(temp_path, path)
+        stem = np.load(path, mmap_mode='r')
+        self.evict(keep=path)
+        return stem
+
+    def _entries(self):
+        entries = []
+        for filename in os.listdir(self.stem_dir):
+            if not filename.endswith('.npy'):
+                continue
+            path = os.path.join(self.stem_dir, filename)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def evict(self, keep=None):
+        """Remove least recently used stems until the store fits in max_bytes.
+
+        Removing a file that is still mapped is safe; the mapping stays valid.
+        """
+        entries = sorted(self._entries())
+        total = sum(entry[1] for entry in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def stats(self):
+        entries = self._entries()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'entries': len(entries),
+                'size_mb': round(sum(entry[1] for entry in entries) / (1024 * 1024), 2),
+                'max_size_mb': round(self.max_bytes / (1024 * 1024), 2)
+            }
@@ -0,0 +1,35 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The app configures its database at import, so point it at a scratch file first
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test.db'))
+os.environ.setdefault('GENERATION_WORKERS', '1')
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """The Flask app with generated_music, its queue and its cache under tmp_path"""
+    from app import app as flask_app
+    from migrations import migrate
+    from src.models.song import db
+    from src.routes import generation
+
+    monkeypatch.setattr(flask_app, 'root_path', str(tmp_path))
+    for name in ('generation_queue', 'render_cache', 'generation_recorder'):
+        monkeypatch.setattr(generation, name, None)
+    with flask_app.app_context():
+        migrate(db.engine)
+        yield flask_app
+        db.session.remove()
+    if generation.generation_queue and generation.generation_queue._executor:
+        generation.generation_queue._executor.shutdown(cancel_futures=True)
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
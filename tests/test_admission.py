@@ -0,0 +1,99 @@
+from concurrent.futures import Future
+
+import pytest
+
+from admission import AdmissionRejected, estimate_cost
+from generation_queue import GenerationQueue
+
+SHORT = 'ya leil ' * 10   # 120 s song
+LONG = 'ya leil ' * 150   # 300 s song
+
+
+class ManualExecutor:
+    """Stands in for the process pool: records dispatched jobs and finishes them on demand"""
+
+    def __init__(self):
+        self.started = []
+
+    def submit(self, func, job_id, jobs_dir, params):
+        future = Future()
+        self.started.append((params['title'], future))
+        return future
+
+    def finish(self, title):
+        future = next(future for name, future in self.started if name == title)
+        future.set_result({'success': True, 'stages': {}})
+
+
+def song(title, lyrics):
+    return {'title': title, 'lyrics': lyrics}
+
+
+@pytest.fixture
+def make_queue(tmp_path, monkeypatch):
+    def make(**options):
+        queue = GenerationQueue(str(tmp_path / 'jobs'), **options)
+        executor = ManualExecutor()
+        monkeypatch.setattr(queue, '_get_executor', lambda: executor)
+        return queue, executor
+    return make
+
+
+def test_estimates_grow_with_song_length():
+    short, long = estimate_cost(song('short', SHORT)), estimate_cost(song('long', LONG))
+    assert short['duration_seconds'] == 120 and long['duration_seconds'] == 300
+    assert short['cpu_seconds'] < long['cpu_seconds']
+
+
+def test_short_jobs_start_before_long_ones_queued_earlier(make_queue):
+    queue, executor = make_queue(max_workers=1)
+    for title, lyrics in [('long1', LONG), ('long2', LONG), ('short1', SHORT), ('short2', SHORT)]:
+        queue.submit(song(title, lyrics))
+
+    for title in ('long1', 'short1', 'short2'):
+        executor.finish(title)
+    assert [title for title, _ in executor.started] == ['long1', 'short1', 'short2', 'long2']
+
+
+def test_without_a_cost_weight_jobs_start_in_arrival_order(make_queue):
+    queue, executor = make_queue(max_workers=1, cost_weight=0)
+    for title, lyrics in [('long1', LONG), ('long2', LONG), ('short1', SHORT)]:
+        queue.submit(song(title, lyrics))
+
+    for title in ('long1', 'long2'):
+        executor.finish(title)
+    assert [title for title, _ in executor.started] == ['long1', 'long2', 'short1']
+
+
+def test_long_wait_is_rejected_with_retry_after_while_a_short_job_is_admitted(make_queue, monkeypatch):
+    queue, _ = make_queue(max_workers=1)
+    for index in range(4):
+        queue.submit(song(f'long{index}', LONG))
+    wait = queue.stats()['estimated_wait_seconds']
+    monkeypatch.setenv('ADMISSION_MAX_WAIT_SECONDS', str(wait - 2))
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        queue.admit(song('late long', LONG))
+    assert rejected.value.status == 429
+    assert rejected.value.retry_after >= 1
+
+    # Shortest-job-first puts a short song ahead of the queued long ones
+    assert queue.admit(song('late short', SHORT))['duration_seconds'] == 120
+
+
+def test_render_bigger_than_the_memory_budget_is_refused(make_queue):
+    queue, _ = make_queue(memory_budget=1024 * 1024)
+    with pytest.raises(AdmissionRejected) as rejected:
+        queue.admit(song('huge', SHORT), check_queue=False)
+    assert rejected.value.status == 413
+
+
+def test_jobs_wait_for_memory_as_well_as_workers(make_queue):
+    budget = estimate_cost(song('one', SHORT))['memory_bytes'] * 3 // 2
+    queue, executor = make_queue(max_workers=2, memory_budget=budget)
+    queue.submit(song('first', SHORT))
+    queue.submit(song('second', SHORT))
+    assert [title for title, _ in executor.started] == ['first']
+
+    executor.finish('first')
+    assert [title for title, _ in executor.started] == ['first', 'second']
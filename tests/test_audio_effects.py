@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from audio_effects import (EQ_IMPULSE_LENGTH, SHELF_FREQUENCY, EffectsChain, biquad_impulse_response,
+                           brightness_gain_db, chain_filter, high_shelf_coefficients, room_impulse_response)
+
+SAMPLE_RATE = 8000
+PARTITION = 256
+
+
+def chain_response(style, region, brightness):
+    """The whole chain's impulse response, built directly from its two stages"""
+    b, a = high_shelf_coefficients(SAMPLE_RATE, SHELF_FREQUENCY, brightness_gain_db(brightness))
+    return np.convolve(biquad_impulse_response(b, a, EQ_IMPULSE_LENGTH),
+                       room_impulse_response(style, region, SAMPLE_RATE))
+
+
+def test_room_and_chain_filters_are_built_once_and_shared():
+    chain_filter.cache_clear()
+    first = EffectsChain('classical', 'egyptian', 1.2, SAMPLE_RATE, PARTITION)
+    second = EffectsChain('classical', 'egyptian', 1.2, SAMPLE_RATE, PARTITION)
+
+    assert second.partitions is first.partitions
+    assert chain_filter.cache_info().hits == 1
+    assert room_impulse_response('classical', 'egyptian', SAMPLE_RATE) is \
+        room_impulse_response('classical', 'egyptian', SAMPLE_RATE)
+
+    # Shared filters are read-only so one song cannot change another's
+    with pytest.raises(ValueError):
+        first.partitions[0, 0] = 0
+
+
+def test_block_wise_output_matches_a_direct_convolution():
+    rng = np.random.default_rng(7)
+    signal = rng.uniform(-0.5, 0.5, 20 * PARTITION + 100)
+    chain = EffectsChain('modern', 'gulf', 0.8, SAMPLE_RATE, PARTITION)
+
+    output = signal.copy()
+    for start in range(0, len(output), 4 * PARTITION):
+        chain.process(output[start:start + 4 * PARTITION])
+
+    expected = np.convolve(signal, chain_response('modern', 'gulf', 0.8))[:len(signal)]
+    np.testing.assert_allclose(output, expected, atol=1e-9)
+
+
+@pytest.mark.parametrize('style, region, brightness', [('religious', 'maghrebi', 1.5), ('pop', 'mixed', 0.7)])
+def test_output_never_exceeds_the_gain_bound(style, region, brightness):
+    chain = EffectsChain(style, region, brightness, SAMPLE_RATE, PARTITION)
+    response = chain_response(style, region, brightness)
+    assert chain.gain_bound == pytest.approx(np.sum(np.abs(response)))
+
+    # The input that lines up with the signs of the response reaches the bound exactly
+    worst = np.sign(response[::-1])
+    output = chain.process(np.concatenate([worst, np.zeros(PARTITION)]))
+    peak = np.max(np.abs(output))
+    assert peak <= chain.gain_bound * (1 + 1e-9)
+    assert peak == pytest.approx(chain.gain_bound, rel=1e-6)
+
+
+def test_blocks_after_a_partial_block_are_refused():
+    chain = EffectsChain('folk', 'iraqi', 1.0, SAMPLE_RATE, PARTITION)
+    chain.process(np.zeros(PARTITION // 2))
+    with pytest.raises(ValueError):
+        chain.process(np.zeros(PARTITION))
+
+    chain.reset()
+    chain.process(np.zeros(PARTITION))
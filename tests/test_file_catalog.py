@@ -0,0 +1,15 @@
+import pytest
+
+from file_catalog import record_audio_file
+from src.models.song import db, AudioFile
+
+
+def test_cataloged_file_is_not_moved_to_another_song(app):
+    record_audio_file('song_hijaz_modern_a1.mp3', 100, 'mp3', song_id=1)
+    db.session.commit()
+
+    with pytest.raises(ValueError):
+        record_audio_file('song_hijaz_modern_a1.mp3', 200, 'mp3', song_id=2)
+    db.session.rollback()
+
+    assert AudioFile.query.filter_by(filename='song_hijaz_modern_a1.mp3').one().song_id == 1
@@ -0,0 +1,44 @@
+import os
+import shutil
+import threading
+
+import numpy as np
+import pytest
+
+from audio_encoder import AudioEncoder, get_ffmpeg_binary
+from generation_queue import GenerationQueue, JobStore
+
+
+def test_progress_writes_keep_a_cancel_request(tmp_path):
+    store = JobStore(str(tmp_path))
+    store.save({'id': 'job', 'status': 'running'})
+    stale = store.load('job')
+
+    store.request_cancel('job')
+    store.update('job', stage='encoding', progress=0.3)
+    store.save(dict(stale, progress=0.5))
+
+    assert store.cancel_requested('job')
+    assert not store.cancel_requested('other')
+
+
+@pytest.mark.skipif(shutil.which(get_ffmpeg_binary()) is None, reason='ffmpeg not available')
+def test_workers_started_during_an_encode_do_not_hold_its_pipe(tmp_path):
+    queue = GenerationQueue(str(tmp_path / 'jobs'), max_workers=1)
+    finished = threading.Event()
+
+    def blocks():
+        yield np.zeros(4410)
+        # The queue's first job starts its pool while ffmpeg's stdin is open
+        queue._get_executor().submit(os.getpid).result()
+        yield np.zeros(4410)
+
+    def encode():
+        AudioEncoder('mp3', sample_rate=44100).encode_blocks(blocks(), str(tmp_path / 'out.mp3'))
+        finished.set()
+
+    threading.Thread(target=encode, daemon=True).start()
+    try:
+        assert finished.wait(60), 'ffmpeg never saw the end of its input'
+    finally:
+        queue._executor.shutdown(wait=False, cancel_futures=True)
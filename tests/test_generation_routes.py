@@ -0,0 +1,202 @@
+import io
+import os
+import time
+import shutil
+import asyncio
+import threading
+
+import pytest
+
+from audio_encoder import get_ffmpeg_binary
+
+needs_ffmpeg = pytest.mark.skipif(shutil.which(get_ffmpeg_binary()) is None, reason='ffmpeg not available')
+
+
+def lyrics_upload(text='Hello song\nya leil ya ein'):
+    return (io.BytesIO(text.encode('utf-8')), 'lyrics.txt')
+
+
+def wait_for_job(client, job_id, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f'/api/generation/jobs/{job_id}').get_json()['job']
+        if job['status'] in ('completed', 'failed', 'cancelled'):
+            return job
+        time.sleep(0.2)
+    raise AssertionError(f'job {job_id} did not finish')
+
+
+@pytest.mark.parametrize('method, path, status', [
+    ('get', '/api/generation/list', 200),
+    ('get', '/api/generation/queue', 200),
+    ('get', '/api/generation/cache', 200),
+    ('get', '/api/generation/files', 200),
+    ('get', '/api/generation/jobs/missing', 404),
+    ('post', '/api/generation/jobs/missing/cancel', 404),
+    ('get', '/api/generation/batch/missing', 404),
+    ('post', '/api/generation/batch', 400),
+    ('post', '/api/generation/999999/encode', 404),
+    ('get', '/api/generation/play/missing.mp3', 404),
+    ('post', '/api/generation/generate', 400),
+])
+def test_blueprint_routes_respond(client, method, path, status):
+    response = getattr(client, method)(path)
+    assert response.status_code == status
+    assert response.is_json
+    assert response.get_json()['success'] is (status == 200)
+
+
+def test_generate_returns_a_pollable_job(client):
+    response = client.post('/api/generation/generate', data={'lyrics_file': lyrics_upload(), 'tempo': '120'},
+                           content_type='multipart/form-data')
+    assert response.status_code == 202
+    job_id = response.get_json()['job_id']
+    assert client.get(f'/api/generation/jobs/{job_id}').status_code == 200
+    client.post(f'/api/generation/jobs/{job_id}/cancel')
+    assert wait_for_job(client, job_id)['status'] in ('cancelled', 'completed')
+
+
+@needs_ffmpeg
+def test_generated_song_plays_and_lists(client):
+    response = client.post('/api/generation/generate', data={'lyrics_file': lyrics_upload()},
+                           content_type='multipart/form-data')
+    job = wait_for_job(client, response.get_json()['job_id'])
+    assert job['status'] == 'completed', job.get('error')
+
+    play = client.get(job['play_url'])
+    assert play.status_code == 200
+    assert play.mimetype == 'audio/mpeg'
+    assert play.data
+
+    songs = client.get('/api/generation/list').get_json()['songs']
+    assert job['result']['song_id'] in [song['id'] for song in songs]
+
+
+@pytest.mark.parametrize('route', ['play', 'download'])
+@pytest.mark.parametrize('filename', ['jobs/job.json', 'cache/key.mp3', '../app.db', 'notes.txt'])
+def test_only_generated_audio_is_served(app, client, route, filename):
+    generated_dir = os.path.join(app.root_path, 'generated_music')
+    for path in ('jobs/job.json', 'cache/key.mp3', 'notes.txt'):
+        os.makedirs(os.path.dirname(os.path.join(generated_dir, path)), exist_ok=True)
+        with open(os.path.join(generated_dir, path), 'w') as f:
+            f.write('private')
+
+    response = client.get(f'/api/generation/{route}/{filename}')
+    assert response.status_code in (400, 404)
+    assert b'private' not in response.data
+
+
+@needs_ffmpeg
+def test_songs_sharing_a_title_keep_their_own_files(client):
+    jobs = []
+    for tempo in ('100', '140'):
+        response = client.post('/api/generation/generate', data={'lyrics_file': lyrics_upload(), 'tempo': tempo},
+                               content_type='multipart/form-data')
+        jobs.append(wait_for_job(client, response.get_json()['job_id']))
+
+    filenames = [job['result']['filename'] for job in jobs]
+    assert filenames[0] != filenames[1]
+    downloads = [client.get(f"/api/generation/{job['result']['song_id']}/download") for job in jobs]
+    assert [download.status_code for download in downloads] == [200, 200]
+    assert downloads[0].data != downloads[1].data
+
+
+def test_preview_is_refused_when_every_slot_is_busy(client, monkeypatch):
+    from src.routes import generation
+
+    busy = threading.BoundedSemaphore(1)
+    busy.acquire()
+    monkeypatch.setattr(generation, 'preview_slots', busy)
+    monkeypatch.setattr(generation, 'PREVIEW_SLOT_TIMEOUT', 0.01)
+
+    response = client.post('/api/generation/generate', data={'lyrics_file': lyrics_upload(), 'preview': '1'},
+                           content_type='multipart/form-data')
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '1'
+
+
+def test_encoding_song_streams_only_on_threaded_servers_with_a_free_slot(app, client, monkeypatch):
+    from src.routes import generation
+
+    generated_dir = os.path.join(app.root_path, 'generated_music')
+    os.makedirs(generated_dir, exist_ok=True)
+    part_path = os.path.join(generated_dir, 'live.mp3.part')
+    with open(part_path, 'wb') as f:
+        f.write(b'first')
+
+    # Sync workers are told to come back rather than blocked for the whole encode
+    response = client.get('/api/generation/play/live.mp3')
+    assert response.status_code == 202
+    assert response.headers['Retry-After'] == '2'
+
+    slots = threading.BoundedSemaphore(1)
+    monkeypatch.setattr(generation, 'live_stream_slots', slots)
+    threaded = {'wsgi.multithread': True}
+    response = client.get('/api/generation/play/live.mp3', environ_overrides=threaded, buffered=False)
+    assert response.status_code == 200
+    assert client.get('/api/generation/play/live.mp3', environ_overrides=threaded).status_code == 202
+
+    chunks = iter(response.response)
+    assert next(chunks) == b'first'
+    with open(part_path, 'ab') as f:
+        f.write(b' second')
+    os.rename(part_path, os.path.join(generated_dir, 'live.mp3'))
+    assert b''.join(chunks) == b' second'
+    response.close()
+    assert slots.acquire(blocking=False)
+
+
+
+@needs_ffmpeg
+def test_routes_predict_the_filename_the_generator_writes(app):
+    from music_generator import ArabicMusicGenerator
+    from src.routes.generation import build_generation_params, build_song_filename
+
+    params = build_generation_params('ya leil ya ein', {'title': 'Ya Leil! (live)', 'maqam': 'saba', 'style': 'folk'})
+    result = asyncio.run(ArabicMusicGenerator().generate_song(**params))
+
+    assert result['filename'] == build_song_filename(params) == f"Ya Leil live_saba_folk_{params['render_id']}.mp3"
+    assert os.path.exists(os.path.join(params['output_dir'], result['filename']))
+
+
+def test_jobs_complete_only_once_their_song_is_committed(app, tmp_path, monkeypatch):
+    from concurrent.futures import Future
+    from generation_queue import GenerationQueue
+    from src.models.song import GeneratedSong, db
+    from src.routes.generation import BatchRecorder, build_generation_params
+
+    futures = []
+    queue = GenerationQueue(str(tmp_path / 'jobs'), max_workers=1)
+    monkeypatch.setattr(queue, '_get_executor', lambda: type('Executor', (), {
+        'submit': lambda self, *args: futures.append(Future()) or futures[-1]})())
+    recorder = BatchRecorder(app, queue, commit_size=10, flush_interval=60)
+
+    params = build_generation_params('ya leil ya ein', {})
+    job = queue.submit(params, on_complete=lambda job, result: recorder.add(job, params, result))
+    queue.store.update(job['id'], status='running')  # As the worker does when it starts
+    futures[0].set_result({'success': True, 'filename': 'song.mp3', 'file_size_mb': 0.1, 'file_size_bytes': 100000,
+                           'duration_seconds': 120.0, 'format': 'mp3', 'checksum': '0' * 64,
+                           'generation_time': 1.0})
+
+    waiting = queue.get(job['id'])
+    assert (waiting['status'], waiting['stage']) == ('running', 'saving')
+    assert queue.stats()['running'] == 0  # The worker slot is already free
+
+    recorder.flush()
+    done = queue.get(job['id'])
+    assert done['status'] == 'completed'
+    assert db.session.get(GeneratedSong, done['result']['song_id']).title == params['title']
+
+
+@pytest.mark.parametrize('tempo', ['0', '-20', '39', '301', 'fast'])
+def test_tempo_outside_the_renderable_range_is_rejected(client, tempo):
+    response = client.post('/api/generation/generate', data={'lyrics_file': lyrics_upload(), 'tempo': tempo},
+                           content_type='multipart/form-data')
+    assert response.status_code == 400
+    assert 'empo' in response.get_json()['error']
+
+
+def test_tempo_range_includes_its_bounds(app):
+    from src.routes.generation import build_generation_params
+
+    assert [build_generation_params('ya leil', {'tempo': tempo})['tempo'] for tempo in ('40', 300)] == [40, 300]
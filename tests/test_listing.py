@@ -0,0 +1,81 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.models.song import GeneratedSong, Song, db
+
+
+@pytest.fixture
+def songs(app):
+    """Five generated songs in a region of their own, two sharing a timestamp"""
+    region = f'listing-{uuid.uuid4().hex[:8]}'
+    start = datetime(2024, 1, 1)
+    dates = [start, start + timedelta(hours=1), start + timedelta(hours=1),
+             start + timedelta(hours=2), start + timedelta(hours=3)]
+    rows = [GeneratedSong(title=f'song {index}', lyrics='ya leil ' * 30, maqam='hijaz', style='modern', tempo=120,
+                          emotion='sad', region=region, generation_date=date)
+            for index, date in enumerate(dates)]
+    db.session.add_all(rows)
+    db.session.commit()
+    newest_first = sorted(rows, key=lambda row: (row.generation_date, row.id), reverse=True)
+    return region, [row.id for row in newest_first]
+
+
+def test_cursor_pages_cover_every_song_once_in_order(client, songs):
+    region, expected = songs
+    seen, cursor = [], None
+    while True:
+        query = {'region': region, 'limit': 2}
+        if cursor:
+            query['cursor'] = cursor
+        page = client.get('/api/generation/list', query_string=query).get_json()
+        assert page['success'] and len(page['songs']) <= 2
+        seen.extend(song['id'] for song in page['songs'])
+        cursor = page['next_cursor']
+        if not cursor:
+            break
+    assert seen == expected
+
+
+def test_summary_pages_leave_out_the_lyrics(client, songs):
+    region, _ = songs
+    song = client.get('/api/generation/list', query_string={'region': region, 'limit': 1}).get_json()['songs'][0]
+    assert 'lyrics' not in song
+    assert len(song['lyrics_preview']) == 100
+
+
+def test_rows_added_between_pages_do_not_shift_the_next_page(client, songs):
+    region, expected = songs
+    first = client.get('/api/generation/list', query_string={'region': region, 'limit': 2}).get_json()
+
+    db.session.add(GeneratedSong(title='newer', lyrics='la', maqam='hijaz', style='modern', tempo=120,
+                                 emotion='sad', region=region, generation_date=datetime(2030, 1, 1)))
+    db.session.commit()
+
+    second = client.get('/api/generation/list', query_string={
+        'region': region, 'limit': 2, 'cursor': first['next_cursor']}).get_json()
+    assert [song['id'] for song in second['songs']] == expected[2:4]
+
+
+@pytest.mark.parametrize('path', ['/api/generation/list', '/api/songs'])
+@pytest.mark.parametrize('query', [{'cursor': 'not-a-cursor'}, {'since': 'yesterday'}, {'fields': 'everything'}])
+def test_malformed_listing_arguments_are_rejected(client, path, query):
+    response = client.get(path, query_string=query)
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+
+
+def test_uploaded_songs_page_the_same_way(app, client):
+    region = f'listing-{uuid.uuid4().hex[:8]}'
+    db.session.add_all([Song(title=f'upload {index}', artist='Fairuz', lyrics='ya leil', maqam='bayati', style='classical',
+                             tempo=90, emotion='joyful', region=region, upload_date=datetime(2024, 1, 1, index))
+                        for index in range(3)])
+    db.session.commit()
+
+    first = client.get('/api/songs', query_string={'region': region, 'limit': 2}).get_json()
+    second = client.get('/api/songs', query_string={'region': region, 'limit': 2,
+                                                    'cursor': first['next_cursor']}).get_json()
+    titles = [song['title'] for song in first['songs'] + second['songs']]
+    assert titles == ['upload 2', 'upload 1', 'upload 0']
+    assert second['next_cursor'] is None
@@ -0,0 +1,93 @@
+import json
+
+from flask import Flask
+from sqlalchemy import create_engine, inspect, text
+
+import database_config
+import migrations
+from migrations import get_engine, migrate
+from src.models.song import db
+
+
+def test_relative_sqlite_url_migrates_the_file_the_app_opens(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', 'sqlite:///relative.db')
+    monkeypatch.setattr(database_config, 'INSTANCE_DIR', str(tmp_path / 'instance'))
+    (tmp_path / 'elsewhere').mkdir()
+    monkeypatch.chdir(tmp_path / 'elsewhere')
+
+    engine = get_engine()
+    migrate(engine)
+    engine.dispose()
+
+    app = Flask('relative', instance_path=str(tmp_path / 'flask_instance'))
+    database_config.configure_database(app)
+    db.init_app(app)
+    with app.app_context():
+        assert 'generated_songs' in inspect(db.engine).get_table_names()
+        db.engine.dispose()
+    assert (tmp_path / 'instance' / 'relative.db').exists()
+
+
+def legacy_engine(tmp_path):
+    """A database from before the migrations: generated_songs without the later columns"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as connection:
+        connection.execute(text(
+            "CREATE TABLE generated_songs (id INTEGER PRIMARY KEY, title VARCHAR(200) NOT NULL, lyrics TEXT NOT NULL, "
+            "maqam VARCHAR(50) NOT NULL, style VARCHAR(50) NOT NULL, tempo INTEGER NOT NULL, "
+            "emotion VARCHAR(50) NOT NULL, region VARCHAR(50) NOT NULL, generation_date DATETIME, file_info TEXT)"
+        ))
+        connection.execute(text(
+            "INSERT INTO generated_songs (title, lyrics, maqam, style, tempo, emotion, region, file_info) "
+            "VALUES ('old', 'ya leil', 'hijaz', 'modern', 120, 'sad', 'mixed', :file_info)"
+        ), {'file_info': json.dumps({'generation_time': 12.5})})
+    return engine
+
+
+def versions(engine):
+    with engine.connect() as connection:
+        return [row[0] for row in connection.execute(text("SELECT version FROM schema_version ORDER BY version"))]
+
+
+def test_migrations_upgrade_a_legacy_database_once(tmp_path):
+    engine = legacy_engine(tmp_path)
+    assert migrate(engine) == [version for version, _, _ in sorted(migrations.MIGRATIONS)]
+    assert migrate(engine) == []
+    assert versions(engine) == sorted(version for version, _, _ in migrations.MIGRATIONS)
+
+    columns = {column['name'] for column in inspect(engine).get_columns('generated_songs')}
+    assert {'generation_time', 'render_manifest'} <= columns
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT generation_time FROM generated_songs")).scalar() == 12.5
+
+
+def test_interrupted_migration_can_be_run_again(tmp_path):
+    engine = legacy_engine(tmp_path)
+    migrate(engine)
+
+    # As if the process died after the schema change but before recording it
+    with engine.begin() as connection:
+        connection.execute(text("DELETE FROM schema_version WHERE version IN (2, 4)"))
+    assert migrate(engine) == [2, 4]
+    assert migrate(engine) == []
+    with engine.connect() as connection:
+        assert connection.execute(text("SELECT generation_time FROM generated_songs")).scalar() == 12.5
+
+
+def test_new_migration_is_applied_and_recorded(tmp_path, monkeypatch):
+    engine = legacy_engine(tmp_path)
+    migrate(engine)
+    latest = max(versions(engine))
+
+    calls = []
+    monkeypatch.setattr(migrations, 'MIGRATIONS', list(migrations.MIGRATIONS))
+    migrations.migration(latest + 1, 'songs_notes')(
+        lambda engine: calls.append(None) or migrations.add_column(engine, 'songs', 'notes', 'TEXT')
+    )
+
+    assert [version for version, _, _ in migrations.pending_migrations(engine)] == [latest + 1]
+    assert migrate(engine) == [latest + 1]
+    assert migrate(engine) == []
+    assert calls == [None]
+    assert max(versions(engine)) == latest + 1
+    assert 'notes' in {column['name'] for column in inspect(engine).get_columns('songs')}
@@ -0,0 +1,42 @@
+import os
+import shutil
+import asyncio
+
+import numpy as np
+import pytest
+
+from audio_encoder import get_ffmpeg_binary
+from music_generator import ArabicMusicGenerator
+
+
+@pytest.mark.skipif(shutil.which(get_ffmpeg_binary()) is None, reason='ffmpeg not available')
+def test_cancel_check_stops_the_render_between_blocks(tmp_path):
+    calls = []
+
+    def check_cancelled():
+        calls.append(None)
+        if len(calls) == 3:
+            raise RuntimeError('Job cancelled')
+
+    result = asyncio.run(ArabicMusicGenerator().generate_song(
+        'Draft', 'ya leil ' * 10, 'hijaz', 'modern', 'neutral', 'mixed', 120, str(tmp_path),
+        check_cancelled=check_cancelled, render_id='abc'
+    ))
+
+    assert not result['success']
+    assert len(calls) == 3
+    assert os.listdir(tmp_path) == []
+
+
+def test_peak_normalization_mixes_once_and_matches_a_whole_buffer(monkeypatch):
+    generator = ArabicMusicGenerator()
+    plan = lambda: generator.plan_procedural_music('ya leil ' * 60, 'hijaz', 'modern', 'sad', 'mixed', 120, seed=1)
+    mixed = np.concatenate(list(generator.iter_mixed_blocks(plan())))
+
+    passes = []
+    iter_mixed_blocks = generator.iter_mixed_blocks
+    monkeypatch.setattr(generator, 'iter_mixed_blocks', lambda *args: passes.append(None) or iter_mixed_blocks(*args))
+    normalized = np.concatenate(list(generator.iter_procedural_blocks(plan(), normalize='peak')))
+
+    assert len(passes) == 1
+    np.testing.assert_array_equal(normalized, mixed * (0.8 / np.abs(mixed).max()))
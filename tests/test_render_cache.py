@@ -0,0 +1,21 @@
+import os
+
+from render_cache import RenderCache
+
+
+def test_repeat_materialize_leaves_no_temp_files(tmp_path):
+    cache = RenderCache(str(tmp_path / 'cache'))
+    rendered = tmp_path / 'song.mp3'
+    rendered.write_bytes(b'mp3 data')
+    cache.store('key', str(rendered), {'file_size_mb': 0.0})
+
+    output_dir = tmp_path / 'out'
+    output_dir.mkdir()
+    output_path = str(output_dir / 'song.mp3')
+    for _ in range(3):
+        cache.materialize('key', output_path)
+    cache.store('key', output_path, {'file_size_mb': 0.0})
+
+    assert os.listdir(output_dir) == ['song.mp3']
+    assert sorted(os.listdir(cache.cache_dir)) == ['key.json', 'key.mp3']
+    assert (output_dir / 'song.mp3').read_bytes() == b'mp3 data'
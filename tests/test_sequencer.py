@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from music_generator import ArabicMusicGenerator
+from rhythm_engine import describe_iqa, hit_kernel, render_cycle
+from sequencer import (EVENT_DTYPE, STEMS, VOICE_VELOCITIES, VOICES, build_events, peak_bound, render_events,
+                       split_stems, stroke_events)
+
+SAMPLE_RATE = 8000
+
+
+@pytest.fixture(scope='module')
+def generator():
+    return ArabicMusicGenerator()
+
+
+@pytest.fixture(scope='module')
+def plan(generator):
+    # 60 words make a 120 s song: four 30 s sections of 16 notes
+    return generator.plan_procedural_music('ya leil ' * 30, 'bayati', 'traditional', 'sad', 'egyptian', 96, seed=3)
+
+
+def hit_source(event):
+    return hit_kernel(VOICES[event['voice']], SAMPLE_RATE, np.dtype(np.float64).str)
+
+
+@pytest.mark.parametrize('iqa, tempo', [('maqsum', 120), ('samai', 70), ('wahda', 180)])
+def test_strokes_match_the_looped_cycle_renderer(iqa, tempo):
+    rhythm = describe_iqa(iqa)
+    cycle = render_cycle(rhythm, tempo, SAMPLE_RATE)
+    cycles = 6
+    total = cycles * len(cycle)
+
+    instruments = stroke_events(rhythm, tempo, total, SAMPLE_RATE)
+    events = np.concatenate(instruments)
+    events = events[np.argsort(events['onset'], kind='stable')]
+    sequenced = render_events(events, 0, total, np.zeros(total), hit_source)
+
+    # The loop wraps each cycle's tail onto its own start, so the first cycle differs
+    looped = np.tile(cycle, cycles) * VOICE_VELOCITIES['dum']
+    assert {VOICE_VELOCITIES[name] for _, name in rhythm['strokes']} == {VOICE_VELOCITIES['dum']}
+    np.testing.assert_allclose(sequenced[len(cycle):], looped[len(cycle):], atol=1e-12)
+
+
+def test_note_stems_match_the_phrase_renderer(generator, plan):
+    manifest = plan['manifest']
+    section_seconds = manifest['duration'] / len(manifest['form'])
+
+    for voice, (spec, events) in enumerate(zip(manifest['voices'], plan['stem_events'])):
+        phrases = generator.generate_arabic_voices(manifest['maqam'], [spec['base_freq']] * len(spec['phrases']),
+                                                   section_seconds, degrees=np.asarray(spec['phrases']))
+        expected = np.concatenate([phrases[index] for index in manifest['form']]) * VOICE_VELOCITIES[VOICES[voice]]
+        stem = generator.render_stem(plan, events)
+        np.testing.assert_allclose(stem[:len(expected)], expected, rtol=1e-6, atol=1e-9)
+        # Notes are whole samples long, so the song ends with a few samples of silence
+        assert not stem[len(expected):].any()
+
+
+def test_block_renders_join_up_to_the_whole_song(generator, plan):
+    events = plan['stem_events'][-1]
+    whole = generator.render_stem(plan, events)
+    step = 50000
+    blocks = [generator.render_stem(plan, events, start, min(start + step, plan['total_samples']))
+              for start in range(0, plan['total_samples'], step)]
+    np.testing.assert_array_equal(np.concatenate(blocks), whole)
+
+
+def test_events_are_sorted_and_split_into_every_stem_once(generator, plan):
+    events = plan['events']
+    assert np.all(np.diff(events['onset']) >= 0)
+    assert sum(len(stem) for stem in split_stems(events)) == len(events)
+    assert len(plan['stem_events']) == len(STEMS)
+
+    again = build_events(plan['manifest'], generator.get_scale('bayati'), generator.sample_rate)
+    np.testing.assert_array_equal(again, events)
+
+
+def test_peak_bound_covers_the_mixed_song(generator, plan):
+    mixed = sum(generator.render_stem(plan, events) for events in plan['stem_events'])
+    bound = peak_bound(plan['events'], generator.voice_peaks())
+    assert np.max(np.abs(mixed)) <= bound
+
+
+def test_peak_bound_counts_only_events_sounding_together():
+    events = np.zeros(3, dtype=EVENT_DTYPE)
+    events['onset'] = [0, 100, 150]
+    events['duration'] = 100
+    events['velocity'] = [0.5, 0.5, 0.25]
+    peaks = [1.0] * len(VOICES)
+
+    # The second event starts as the first ends, so only the last two overlap
+    assert peak_bound(events, peaks) == pytest.approx(0.75)
+    assert peak_bound(events[:0], peaks) == 0.0
@@ -0,0 +1,68 @@
+import os
+
+import numpy as np
+
+from music_generator import ArabicMusicGenerator
+from stem_store import StemStore, stem_key
+
+
+def test_second_lookup_maps_the_stored_stem_without_rendering(tmp_path):
+    store = StemStore(str(tmp_path), max_bytes=1024 * 1024)
+    renders = []
+
+    def render():
+        renders.append(None)
+        return np.arange(1000, dtype=np.float64)
+
+    first = store.get('key', render)
+    second = store.get('key', render)
+
+    assert len(renders) == 1
+    assert isinstance(second, np.memmap) and not second.flags.writeable
+    np.testing.assert_array_equal(second, first)
+    assert (store.hits, store.misses) == (1, 1)
+
+
+def test_least_recently_used_stems_are_evicted(tmp_path):
+    stem = np.zeros(1000)
+    store = StemStore(str(tmp_path), max_bytes=2 * stem.nbytes + 1024)
+    for age, key in enumerate(['old', 'used', 'new']):
+        store.get(key, lambda: stem)
+        os.utime(tmp_path / f'{key}.npy', (age, age))
+    store.get('used', lambda: stem)  # Lookups count as use
+
+    store.get('newest', lambda: stem)
+    assert sorted(os.listdir(tmp_path)) == ['newest.npy', 'used.npy']
+
+
+def test_song_changing_only_its_mood_reuses_every_stem(tmp_path):
+    generator = ArabicMusicGenerator()
+    store = StemStore(str(tmp_path), max_bytes=100 * 1024 * 1024)
+
+    def plan(emotion, iqa=None):
+        manifest = generator.build_manifest('ya leil ' * 10, 'saba', 'folk', emotion, 'mixed', 110, seed=5, iqa=iqa)
+        return generator.plan_from_manifest(manifest, seconds=3)
+
+    generator.attach_stems(plan('sad'), store)
+    assert (store.hits, store.misses) == (0, 4)
+
+    happy = generator.attach_stems(plan('happy'), store)
+    assert (store.hits, store.misses) == (4, 4)
+    fresh = plan('happy')
+    np.testing.assert_array_equal(generator.render_block(happy, 0, happy['total_samples']),
+                                  generator.render_block(fresh, 0, fresh['total_samples']))
+
+    # A new rhythm changes only the percussion stem
+    generator.attach_stems(plan('happy', iqa='saidi'), store)
+    assert (store.hits, store.misses) == (7, 5)
+
+
+def test_stem_keys_follow_the_events_and_render_settings():
+    events = np.zeros(4, dtype=[('onset', '<i8')])
+    key = stem_key('melody', events, 100, 44100, np.float64)
+    assert key == stem_key('melody', events.copy(), 100, 44100, np.float64)
+
+    moved = events.copy()
+    moved['onset'][1] = 7
+    assert len({key, stem_key('melody', moved, 100, 44100, np.float64), stem_key('rhythm', events, 100, 44100, np.float64),
+                stem_key('melody', events, 100, 44100, np.float32)}) == 4